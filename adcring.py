@@ -0,0 +1,143 @@
+from array import array
+
+try:
+    from machine import ADC, Timer
+except ImportError:
+    ADC = Timer = None
+
+# Timer driven ADC sampling into a ring buffer.
+# The timer callback only stores one reading per tick; consumers pop the
+# samples from the main loop in bounded batches, so sampling keeps its
+# rate no matter how long a frame takes. RecordedSource has the same
+# interface and replays recorded samples, so the processing code can run
+# on the host.
+
+
+class AdcRing:
+
+    def __init__(self, pin, rate_hz, capacity=1024, buffer=None):
+        self.adc = ADC(pin)
+        self.rate_hz = rate_hz
+        self.capacity = capacity
+        self.ring = buffer if buffer is not None else array("H", [0] * capacity)
+        self.head = 0       # written by the timer callback
+        self.tail = 0
+        self.overruns = 0
+        self.timer = None
+        self._callback = self._sample   # bound once, the IRQ must not allocate
+
+    def _sample(self, timer):
+        # only the callback writes head and only pop() writes tail
+        head = self.head
+        next_head = head + 1
+        if next_head == self.capacity:
+            next_head = 0
+        if next_head == self.tail:
+            # full: drop the new sample
+            self.overruns += 1
+            return
+        self.ring[head] = self.adc.read_u16()
+        self.head = next_head
+
+    def start(self):
+        self.head = self.tail = 0
+        self.overruns = 0
+        self.timer = Timer(-1)
+        self.timer.init(freq=self.rate_hz, mode=Timer.PERIODIC, callback=self._callback)
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+
+    def available(self):
+        count = self.head - self.tail
+        return count + self.capacity if count < 0 else count
+
+    def pop(self):
+        # oldest sample, -1 when empty
+        tail = self.tail
+        if tail == self.head:
+            return -1
+        value = self.ring[tail]
+        tail += 1
+        self.tail = 0 if tail == self.capacity else tail
+        return value
+
+
+class RecordedSource:
+    # replays recorded 16 bit samples with the AdcRing interface; with a
+    # clock, samples only become available as the clock passes their time.
+    # With a capacity they queue up like in an AdcRing of that size: samples
+    # that find it full are dropped and counted in overruns, so slow frames
+    # on the host lose samples the way they do on the device
+
+    def __init__(self, samples, rate_hz, clock=None, capacity=None):
+        self.samples = samples
+        self.rate_hz = rate_hz
+        self.clock = clock
+        self.capacity = capacity
+        self.limit = len(samples)
+        self.start_us = 0
+        self.start()
+
+    def start(self):
+        self.position = 0       # samples popped
+        self.arrived = 0        # samples due so far, stored or dropped
+        self.queued = 0
+        self.segments = []      # [first, end) sample index runs in the ring
+        self.overruns = 0
+        if self.clock is not None:
+            self.start_us = self.clock.ticks_us()
+
+    def stop(self):
+        pass
+
+    def release(self, count):
+        # make the next count samples visible, like count timer ticks would
+        self.limit = min(len(self.samples), self.position + count)
+
+    def _due(self):
+        if self.clock is None:
+            return self.limit
+        elapsed = self.clock.ticks_diff(self.clock.ticks_us(), self.start_us)
+        return min(self.limit, elapsed * self.rate_hz // 1000000)
+
+    def _value(self, index):
+        return self.samples[index]
+
+    def _arrive(self):
+        due = self._due()
+        count = due - self.arrived
+        if count <= 0:
+            return
+        if self.capacity is not None:
+            room = self.capacity - 1 - self.queued
+            if count > room:
+                self.overruns += count - room
+                count = room
+        if count > 0:
+            segments = self.segments
+            if segments and segments[-1][1] == self.arrived:
+                segments[-1][1] += count
+            else:
+                segments.append([self.arrived, self.arrived + count])
+            self.queued += count
+        self.arrived = due
+
+    def available(self):
+        self._arrive()
+        return self.queued
+
+    def pop(self):
+        self._arrive()
+        if not self.queued:
+            return -1
+        segment = self.segments[0]
+        index = segment[0]
+        segment[0] += 1
+        if segment[0] == segment[1]:
+            self.segments.pop(0)
+        self.queued -= 1
+        self.position += 1
+        return self._value(index)
@@ -0,0 +1,159 @@
+import gc
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1000000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+try:
+    import machine
+except ImportError:
+    machine = None
+
+import fastpath
+
+# Compiled fast paths against their plain Python twins.
+# Run on the device with "mpremote run benchmark.py" (or on the host, where
+# both columns are the Python version). Each case first checks that both
+# versions give the same result, then times them on the work of one frame
+# (panel flush, telemetry ring, mirror row hashing and encoding).
+# On the device it also times a full menu redraw of the attached board
+# drawn from scratch and from the flash cache (menucache.py, MENU_CACHE).
+
+ROUNDS = 5
+
+
+def upscale_frame(upscale_row, canvas, line, width, height, scale):
+    # the row expansion of one ST77xx.show_scaled() flush
+    row_bytes = width * 2
+    for y in range(height):
+        upscale_row(canvas, y * row_bytes, line, scale)
+
+
+def checksum_records(checksum, ring, records, size):
+    # the checksums of a full telemetry ring
+    for offset in range(0, records * size, size):
+        checksum(ring, offset, offset + size - 1)
+
+
+def hash_frame(row_hash, frame, width, height):
+    # the change detection of one mirror.Mirror.frame()
+    row_bytes = width * 2
+    for y in range(height):
+        row_hash(frame, y * row_bytes, row_bytes)
+
+
+def encode_frame(rle_encode, frame, width, height, row):
+    # every row of a frame run-length encoded as by mirror.Mirror.frame()
+    row_bytes = width * 2
+    for y in range(height):
+        rle_encode(frame, y * row_bytes, width, row)
+
+
+def best_us(run):
+    best = None
+    for _ in range(ROUNDS):
+        gc.collect()
+        start = ticks_us()
+        run()
+        us = ticks_diff(ticks_us(), start)
+        if best is None or us < best:
+            best = us
+    return best
+
+
+def compare(name, fast, slow):
+    fast_us = best_us(fast)
+    slow_us = best_us(slow)
+    print("%-28s %8d %8d  x%d.%d" % (name, slow_us, fast_us,
+                                    slow_us // max(1, fast_us), slow_us * 10 // max(1, fast_us) % 10))
+
+
+def menu_redraw():
+    # write_menu() including the panel update, uncached and cached
+    import boards
+    from lib import BreathingSettings
+    backend = boards.load()
+    settings = BreathingSettings()
+    enabled = backend.MENU_CACHE
+    try:
+        backend.MENU_CACHE = False
+        drawn_us = best_us(lambda: backend.write_menu(settings, 10))
+        backend.MENU_CACHE = True
+        import menucache
+        menucache.clear()
+        start = ticks_us()
+        backend.write_menu(settings, 10)
+        store_us = ticks_diff(ticks_us(), start)
+        cached_us = best_us(lambda: backend.write_menu(settings, 10))
+    finally:
+        backend.MENU_CACHE = enabled
+    print("menu redraw %-16s drawn %d us, cached %d us, first cached (store) %d us"
+          % (backend.MENU_CACHE_KEY, drawn_us, cached_us, store_us))
+    print("menu cache %s on this board: set MENU_CACHE = %s in %s.py"
+          % ("wins" if cached_us < drawn_us else "loses", cached_us < drawn_us,
+             boards.module_name(boards.detect())))
+
+
+def main():
+    print("fast paths %s" % ("compiled (viper)" if fastpath.COMPILED else "not compiled"))
+    print("%-28s %8s %8s" % ("case", "py [us]", "fast [us]"))
+
+    for width, height, scale, label in ((80, 40, 2, "0.96\""), (120, 67, 2, "1.14\""),
+                                        (60, 33, 4, "1.14\" x4")):
+        canvas = bytearray((i * 7) & 0xFF for i in range(width * height * 2))
+        line = bytearray(width * scale * 2)
+        check = bytearray(len(line))
+        fastpath.upscale_row(canvas, 2 * width, line, scale)
+        fastpath.upscale_row_py(canvas, 2 * width, check, scale)
+        assert line == check, "upscale_row differs"
+        compare("upscale frame %s" % label,
+                lambda: upscale_frame(fastpath.upscale_row, canvas, line, width, height, scale),
+                lambda: upscale_frame(fastpath.upscale_row_py, canvas, line, width, height, scale))
+
+    ring = bytearray((i * 13) & 0xFF for i in range(64 * 9))
+    assert fastpath.checksum(ring, 9, 17) == fastpath.checksum_py(ring, 9, 17), "checksum differs"
+    compare("telemetry checksums x64",
+            lambda: checksum_records(fastpath.checksum, ring, 64, 9),
+            lambda: checksum_records(fastpath.checksum_py, ring, 64, 9))
+
+    # a session bar frame and a noisy one that does not fit as runs
+    width, height = 160, 80
+    bars = bytearray(width * height * 2)
+    for y in range(height):
+        for x in range(width):
+            o = (y * width + x) * 2
+            bars[o] = 0xF8 if x < 100 else (x // 7) & 0xFF
+            bars[o + 1] = y & 0xFF
+    noise = bytearray((i * 29 + i // 7) & 0xFF for i in range(width * height * 2))
+    row = bytearray(width * 2)
+    check = bytearray(len(row))
+    for frame in (bars, noise):
+        for y in range(height):
+            offset = y * width * 2
+            assert (fastpath.row_hash(frame, offset, width * 2)
+                    == fastpath.row_hash_py(frame, offset, width * 2)), "row_hash differs"
+            length = fastpath.rle_encode(frame, offset, width, row)
+            assert length == fastpath.rle_encode_py(frame, offset, width, check), "rle_encode differs"
+            assert row[:max(0, length)] == check[:max(0, length)], "rle_encode differs"
+    compare("mirror row hashes 160x80",
+            lambda: hash_frame(fastpath.row_hash, bars, width, height),
+            lambda: hash_frame(fastpath.row_hash_py, bars, width, height))
+    compare("mirror rle 160x80 bars",
+            lambda: encode_frame(fastpath.rle_encode, bars, width, height, row),
+            lambda: encode_frame(fastpath.rle_encode_py, bars, width, height, row))
+    compare("mirror rle 160x80 noise",
+            lambda: encode_frame(fastpath.rle_encode, noise, width, height, row),
+            lambda: encode_frame(fastpath.rle_encode_py, noise, width, height, row))
+
+    if machine is not None:
+        menu_redraw()
+
+
+main()
@@ -0,0 +1,117 @@
+import gc
+
+from clock import CLOCK
+
+# Board registry: which display/button board is attached and which backend
+# module drives it. detect() looks at board.txt first (one board name, for
+# setups the probes cannot tell apart), then asks the probes in registry
+# order. load() imports only the backend of that board, so the Explorer
+# build never pulls in framebuf drivers and the LCD build never imports
+# picographics (which is missing from plain MicroPython firmware).
+
+EXPLORER = "explorer"
+LCD_114 = "lcd114"
+LCD_096 = "lcd096"
+
+OVERRIDE_FILE = "board.txt"
+
+# what main.py and session.py use from a backend
+SURFACE = ("display", "clear_display", "write_menu", "visualize", "render", "flush",
+           "button_up", "button_down", "button_left", "button_right",
+           "playtone", "bequiet", "STATIC_MODES", "BUTTON_PINS")
+
+
+def probe_explorer():
+    # the Explorer base pulls its I2C bus (GP20 SDA, GP21 SCL) up on the
+    # board; on the Waveshare LCDs GP20 is a joystick contact to ground
+    # and GP21 is not connected, both read low against the pull-downs
+    from machine import Pin
+    high = True
+    for n in (20, 21):
+        pin = Pin(n, Pin.IN, Pin.PULL_DOWN)
+        high = high and pin.value() == 1
+        Pin(n, Pin.IN)
+    return high
+
+
+def probe_waveshare():
+    return not probe_explorer()
+
+
+# (name, backend module, probe); probe None means the board can only be
+# chosen in board.txt. Both Waveshare panels share pins and have no MISO
+# line to read the controller ID, so the 1.14" has to be named.
+BOARDS = (
+    (EXPLORER, "pico_explorer", probe_explorer),
+    (LCD_114, "lcd", None),
+    (LCD_096, "lcd", probe_waveshare),
+)
+
+_detected = None
+_source = None
+
+
+def _override():
+    try:
+        with open(OVERRIDE_FILE) as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    for board in BOARDS:
+        if board[0] == name:
+            return name
+    print("board: unknown board %r in %s, probing" % (name, OVERRIDE_FILE))
+    return None
+
+
+def detect():
+    # name of the attached board, decided once per boot
+    global _detected, _source
+    if _detected is None:
+        _detected = _override()
+        _source = OVERRIDE_FILE
+        if _detected is None:
+            _source = "probe"
+            for name, _, probe in BOARDS:
+                if probe is not None and probe():
+                    _detected = name
+                    break
+            else:
+                _detected = BOARDS[-1][0]
+                _source = "default"
+    return _detected
+
+
+def board_index(name=None):
+    # position of the board in BOARDS, as stored in session logs
+    name = name or detect()
+    for i in range(len(BOARDS)):
+        if BOARDS[i][0] == name:
+            return i
+    raise ValueError("unknown board %s" % name)
+
+
+def module_name(name):
+    for board, module, _ in BOARDS:
+        if board == name:
+            return module
+    raise ValueError("unknown board %s" % name)
+
+
+def load():
+    # import the backend of the attached board and report what it cost
+    name = detect()
+    module = module_name(name)
+    gc.collect()
+    free = gc.mem_free()
+    start = CLOCK.ticks_ms()
+    backend = __import__(module)
+    took = CLOCK.ticks_diff(CLOCK.ticks_ms(), start)
+    gc.collect()
+    missing = [attr for attr in SURFACE if not hasattr(backend, attr)]
+    if missing:
+        raise AttributeError("backend %s lacks %s" % (module, ", ".join(missing)))
+    skipped = sorted(set(m for _, m, _ in BOARDS if m != module))
+    print("board: %s (%s), %s imported in %d ms using %d bytes, not loaded: %s"
+          % (name, _source, module, took, free - gc.mem_free(), ", ".join(skipped)))
+    return backend
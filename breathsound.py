@@ -0,0 +1,257 @@
+from array import array
+
+from clock import CLOCK
+import telemetry
+
+# Breath sound adherence tracking from a microphone on an ADC input.
+# Samples come from an adcring.AdcRing (or a RecordedSource on the host)
+# and are processed in blocks of BLOCK samples with integer math only:
+#   mean absolute deviation per block -> attack/release envelope
+#   -> slowly rising noise floor -> active/quiet with hysteresis.
+# The session reports every phase start; the tracker maps it onto the
+# sample timeline and checks whether breathing is audible during IN and
+# OUT and quiet during HOLD and STAY. Per cycle it keeps three bytes: the
+# share of blocks that matched the cue (0..100) and the onset lag of the
+# inhale and the exhale relative to their cue, in LAG_UNIT_MS steps.
+# poll() takes the whole backlog of the ring, at most max_blocks blocks per
+# call, so the cost per frame is bounded no matter how far behind it is.
+# Samples the ring had to drop while it was full (source.overruns) still
+# count on the sample timeline, so phase boundaries, which come from the
+# clock, land on the right blocks; the block cut by the gap is discarded.
+# The noise floor settles during quiet stretches, so without HOLD or STAY
+# and without pauses between breaths there is little to compare against.
+
+RATE_HZ = 1000
+BLOCK = 32              # samples per block
+
+ATTACK_SHIFT = 1        # envelope follows rising levels quickly
+RELEASE_SHIFT = 2       # and falls slowly
+FLOOR_SHIFT = 9         # noise floor (Q8) rises over ~500 blocks, drops at once
+ON_RATIO_Q4 = 40        # active above 2.5 x floor
+OFF_RATIO_Q4 = 28       # quiet below 1.75 x floor
+MIN_LEVEL = 8           # minimum deviation (12 bit counts) to count as breath
+
+LAG_UNIT_MS = 20
+NO_LAG = -128           # stored when no breath was found for a cue
+_MISSED = -(1 << 29)    # same while the cycle is still running, in ms
+MAX_CYCLES = 128
+RECORD_SIZE = 3
+
+PHASE_IN = 0            # indices into lib.MODES
+PHASE_OUT = 2
+
+
+def _lag_byte(lag_ms):
+    if lag_ms == _MISSED:
+        return NO_LAG & 0xFF
+    lag = lag_ms // LAG_UNIT_MS
+    if lag < -127:
+        lag = -127
+    elif lag > 127:
+        lag = 127
+    return lag & 0xFF
+
+
+def _signed(byte):
+    return byte - 256 if byte > 127 else byte
+
+
+class BreathTracker:
+
+    def __init__(self, source, rate_hz=RATE_HZ, clock=CLOCK, max_blocks=8,
+                 max_cycles=MAX_CYCLES, records=None):
+        self.source = source
+        self.rate_hz = rate_hz
+        self.clock = clock
+        self.max_samples = max_blocks * BLOCK
+        self.max_cycles = max_cycles
+        self.records = records if records is not None else bytearray(RECORD_SIZE * max_cycles)
+        # phase boundaries not yet reached by the sample timeline
+        self.boundary_sample = array("i", [0] * 8)
+        self.boundary_phase = bytearray(8)
+        self.reset()
+
+    def reset(self):
+        self.cycles = 0
+        self.sample = 0
+        self.block_fill = 0
+        self.block_sum = 0
+        self.block_dev = 0
+        self.dc = -1
+        self.envelope = 0
+        self.floor_q8 = -1
+        self.active = False
+        self.last_onset = -1
+        self.overruns = 0           # source.overruns already accounted for
+        self.lost = 0
+        self.boundary_head = 0
+        self.boundary_tail = 0
+        self.phase = -1
+        self.phase_start = 0
+        self._reset_cycle()
+
+    def _reset_cycle(self):
+        self.blocks = 0
+        self.matched = 0
+        self.lag_in = _MISSED
+        self.lag_out = _MISSED
+
+    def start(self):
+        self.reset()
+        self.start_ms = self.clock.ticks_ms()
+        self.source.start()
+
+    def stop(self):
+        self.source.stop()
+        # whatever is still in the ring belongs to the last cycle
+        while self.poll():
+            pass
+        self._advance(0x3FFFFFFF)
+        if self.blocks:
+            self._finish_cycle()
+        telemetry.emit(telemetry.EV_SAMPLES_LOST, self.lost)
+
+    def phase_started(self, phase):
+        sample = self.clock.ticks_diff(self.clock.ticks_ms(), self.start_ms) * self.rate_hz // 1000
+        head = self.boundary_head
+        next_head = (head + 1) % len(self.boundary_phase)
+        if next_head == self.boundary_tail:
+            return
+        self.boundary_sample[head] = sample
+        self.boundary_phase[head] = phase
+        self.boundary_head = next_head
+
+    def poll(self):
+        # returns the number of samples processed
+        source = self.source
+        limit = source.available()
+        lost = source.overruns - self.overruns
+        if lost:
+            # the ring was full and dropped the samples after everything it
+            # holds: drain it, then skip the time they covered
+            limit = 0x3FFFFFFF
+        elif limit > self.max_samples:
+            limit = self.max_samples
+        count = 0
+        while count < limit:
+            x = source.pop()
+            if x < 0:
+                break
+            count += 1
+            x >>= 4
+            if self.dc < 0:
+                self.dc = x
+            self.block_sum += x
+            self.block_dev += x - self.dc if x > self.dc else self.dc - x
+            self.block_fill += 1
+            self.sample += 1
+            if self.block_fill == BLOCK:
+                self._block()
+        if lost:
+            self.overruns += lost
+            self.lost += lost
+            self.sample += lost
+            self.block_sum = self.block_dev = self.block_fill = 0
+        return count
+
+    def _advance(self, sample):
+        # enter every phase that started before sample
+        size = len(self.boundary_phase)
+        while self.boundary_tail != self.boundary_head:
+            tail = self.boundary_tail
+            start = self.boundary_sample[tail]
+            if start > sample:
+                break
+            self.boundary_tail = (tail + 1) % size
+            self._enter_phase(self.boundary_phase[tail], start)
+
+    def _enter_phase(self, phase, start):
+        if phase == PHASE_IN and self.phase >= 0:
+            self._finish_cycle()
+        self.phase = phase
+        self.phase_start = start
+        if self.active and self.last_onset >= 0:
+            # breathing started ahead of the cue
+            lag = (self.last_onset - start) * 1000 // self.rate_hz
+            if phase == PHASE_IN:
+                self.lag_in = lag
+            elif phase == PHASE_OUT:
+                self.lag_out = lag
+
+    def _block(self):
+        block_start = self.sample - BLOCK
+        self._advance(block_start)
+
+        level = self.block_dev // BLOCK
+        self.dc = self.block_sum // BLOCK
+        self.block_sum = self.block_dev = self.block_fill = 0
+
+        envelope = self.envelope
+        if level > envelope:
+            envelope += (level - envelope) >> ATTACK_SHIFT
+        else:
+            envelope -= (envelope - level) >> RELEASE_SHIFT
+        self.envelope = envelope
+
+        floor_q8 = self.floor_q8
+        if floor_q8 < 0 or envelope << 8 < floor_q8:
+            floor_q8 = envelope << 8
+        else:
+            floor_q8 += ((envelope << 8) - floor_q8) >> FLOOR_SHIFT
+        self.floor_q8 = floor_q8
+        floor = floor_q8 >> 8
+
+        if self.active:
+            if envelope * 16 < floor * OFF_RATIO_Q4 or envelope < MIN_LEVEL:
+                self.active = False
+        elif envelope * 16 > floor * ON_RATIO_Q4 and envelope >= MIN_LEVEL:
+            self.active = True
+            self.last_onset = block_start
+            lag = (block_start - self.phase_start) * 1000 // self.rate_hz
+            if self.phase == PHASE_IN and self.lag_in == _MISSED:
+                self.lag_in = lag
+            elif self.phase == PHASE_OUT and self.lag_out == _MISSED:
+                self.lag_out = lag
+
+        if self.phase >= 0:
+            self.blocks += 1
+            expected = self.phase == PHASE_IN or self.phase == PHASE_OUT
+            if self.active == expected:
+                self.matched += 1
+
+    def _finish_cycle(self):
+        score = self.matched * 100 // self.blocks if self.blocks else 0
+        if self.cycles < self.max_cycles:
+            offset = self.cycles * RECORD_SIZE
+            self.records[offset] = score
+            self.records[offset + 1] = _lag_byte(self.lag_in)
+            self.records[offset + 2] = _lag_byte(self.lag_out)
+        self.cycles += 1
+        telemetry.emit(telemetry.EV_ADHERENCE, score)
+        self._reset_cycle()
+
+    def cycle(self, index):
+        # (score 0..100, inhale lag ms, exhale lag ms), lag None if missed
+        offset = index * RECORD_SIZE
+        result = [self.records[offset]]
+        for byte in self.records[offset + 1:offset + 3]:
+            lag = _signed(byte)
+            result.append(None if lag == NO_LAG else lag * LAG_UNIT_MS)
+        return tuple(result)
+
+    def mean_score(self):
+        count = min(self.cycles, self.max_cycles)
+        if not count:
+            return 0
+        return sum(self.records[i * RECORD_SIZE] for i in range(count)) // count
+
+    def report(self):
+        count = min(self.cycles, self.max_cycles)
+        for i in range(count):
+            score, lag_in, lag_out = self.cycle(i)
+            print("cycle %3d adherence %3d%%  inhale %s  exhale %s"
+                  % (i + 1, score,
+                     "-" if lag_in is None else "%+d ms" % lag_in,
+                     "-" if lag_out is None else "%+d ms" % lag_out))
+        print("breathing adherence %d%% over %d cycles, %d samples lost"
+              % (self.mean_score(), self.cycles, self.lost))
@@ -0,0 +1,58 @@
+import time
+
+# Time source for the session loop, the menu loop and tone timing.
+# SystemClock forwards to the MicroPython time module. SimClock keeps its
+# own counter that only moves when asked to, so a whole session can be
+# replayed on the host in a fraction of its real duration.
+# Both expose ticks_ms, ticks_us, ticks_diff, ticks_add and sleep_ms.
+
+
+class SystemClock:
+
+    def __init__(self):
+        # bound straight to the builtins, calling them does not allocate
+        self.ticks_ms = time.ticks_ms
+        self.ticks_us = time.ticks_us
+        self.ticks_diff = time.ticks_diff
+        self.ticks_add = time.ticks_add
+        self.sleep_ms = time.sleep_ms
+
+
+class SimClock:
+
+    def __init__(self, start_ms=0):
+        self.now_us = start_ms * 1000
+
+    def ticks_ms(self):
+        return self.now_us // 1000
+
+    def ticks_us(self):
+        return self.now_us
+
+    @staticmethod
+    def ticks_diff(a, b):
+        return a - b
+
+    @staticmethod
+    def ticks_add(a, b):
+        return a + b
+
+    def sleep_ms(self, ms):
+        self.advance_us(ms * 1000)
+
+    def advance_ms(self, ms):
+        self.advance_us(ms * 1000)
+
+    def advance_us(self, us):
+        if us > 0:
+            self.now_us += us
+
+
+def default_clock():
+    # the real clock on the device, a simulated one anywhere else
+    if hasattr(time, "ticks_ms"):
+        return SystemClock()
+    return SimClock()
+
+
+CLOCK = default_clock()
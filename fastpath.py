@@ -0,0 +1,72 @@
+# Inner loops that run per pixel or per byte.
+# On the device they come from fastpath_viper.py, compiled to machine code
+# by the viper emitter. Each one has a plain Python twin here with the same
+# arguments and results (the *_py functions); those are used on the host
+# and on firmware built without the native emitters, and are the baseline
+# in benchmark.py. Viper functions take at most four arguments.
+
+
+def upscale_row_py(src, offset, dst, scale):
+    # repeat each RGB565 pixel at src[offset:] scale times until dst is full
+    o = 0
+    i = offset
+    end = offset + len(dst) // scale
+    while i < end:
+        hi = src[i]
+        lo = src[i + 1]
+        for _ in range(scale):
+            dst[o] = hi
+            dst[o + 1] = lo
+            o += 2
+        i += 2
+
+
+def checksum_py(buf, start, end):
+    # sum of buf[start:end] modulo 256
+    total = 0
+    for i in range(start, end):
+        total += buf[i]
+    return total & 0xFF
+
+
+def row_hash_py(src, offset, length):
+    # 30 bit hash of length bytes (an even count) of RGB565 pixels
+    h = 5381
+    for i in range(offset, offset + length, 2):
+        h = ((h * 33) ^ (src[i] | src[i + 1] << 8)) & 0xFFFFFFFF
+    return h & 0x3FFFFFFF
+
+
+def rle_encode_py(src, offset, width, dst):
+    # runs of equal RGB565 pixels as (count, pixel) triples in dst; returns
+    # the encoded length, or -1 as soon as it would not fit into dst
+    size = len(dst)
+    o = 0
+    i = offset
+    end = offset + width * 2
+    while i < end:
+        hi = src[i]
+        lo = src[i + 1]
+        count = 1
+        i += 2
+        while i < end and count < 255 and src[i] == hi and src[i + 1] == lo:
+            count += 1
+            i += 2
+        if o + 3 > size:
+            return -1
+        dst[o] = count
+        dst[o + 1] = hi
+        dst[o + 2] = lo
+        o += 3
+    return o
+
+
+try:
+    from fastpath_viper import upscale_row, checksum, row_hash, rle_encode
+    COMPILED = True
+except (ImportError, SyntaxError):
+    upscale_row = upscale_row_py
+    checksum = checksum_py
+    row_hash = row_hash_py
+    rle_encode = rle_encode_py
+    COMPILED = False
@@ -0,0 +1,69 @@
+import micropython
+
+# Viper versions of the loops in fastpath.py. Imported by fastpath only,
+# this module does not compile on the host or on firmware without the
+# native emitters.
+
+
+@micropython.viper
+def upscale_row(src, offset: int, dst, scale: int):
+    s = ptr16(src)
+    d = ptr16(dst)
+    i = offset >> 1
+    end = i + int(len(dst)) // (scale << 1)
+    o = 0
+    while i < end:
+        value = s[i]
+        n = 0
+        while n < scale:
+            d[o] = value
+            o += 1
+            n += 1
+        i += 1
+
+
+@micropython.viper
+def checksum(buf, start: int, end: int) -> int:
+    p = ptr8(buf)
+    total = 0
+    i = start
+    while i < end:
+        total += p[i]
+        i += 1
+    return total & 0xFF
+
+
+@micropython.viper
+def row_hash(src, offset: int, length: int) -> int:
+    s = ptr16(src)
+    i = offset >> 1
+    end = i + (length >> 1)
+    h = 5381
+    while i < end:
+        h = (h * 33) ^ s[i]
+        i += 1
+    return h & 0x3FFFFFFF
+
+
+@micropython.viper
+def rle_encode(src, offset: int, width: int, dst) -> int:
+    s = ptr16(src)
+    d = ptr8(dst)
+    size = int(len(dst))
+    o = 0
+    i = offset >> 1
+    end = i + width
+    while i < end:
+        value = s[i]
+        count = 1
+        i += 1
+        while i < end and count < 255 and s[i] == value:
+            count += 1
+            i += 1
+        if o + 3 > size:
+            return -1
+        d[o] = count
+        d[o + 1] = value & 0xFF
+        d[o + 2] = value >> 8
+        o += 3
+    return o
@@ -0,0 +1,125 @@
+import struct
+import framebuf
+from array import array
+
+# Proportional bitmap fonts for the framebuf based LCD backend.
+# A font lives in a binary atlas file (built by host/make_font.py). Only
+# the glyph table is kept in RAM; glyph bitmaps are read on demand into the
+# slots of a fixed slab and wrapped as MONO_HLSB framebuffers over
+# memoryview slices of it, no copies. When all slots are taken the least
+# recently used glyph is evicted.
+#
+# file layout (little endian):
+#   header  MAGIC | height u8 | first char u8 | glyph count u8 | max width u8
+#   table   per glyph: bitmap offset u32 | width u8 | advance u8
+#   bitmaps MONO_HLSB rows of (width + 7) // 8 bytes
+
+MAGIC = b"FNT1"
+HEADER = "<4sBBBB"
+HEADER_SIZE = 8
+ENTRY = "<IBB"
+ENTRY_SIZE = 6
+
+
+class FontAtlas:
+
+    def __init__(self, path, slots=24):
+        self.file = open(path, "rb")
+        try:
+            self._check(path)
+        except:
+            self.file.close()
+            raise
+
+        self.slot_size = (self.max_width + 7) // 8 * self.height
+        self.slab = bytearray(slots * self.slot_size)
+        slab = memoryview(self.slab)
+        self.slot_views = [slab[i * self.slot_size:(i + 1) * self.slot_size] for i in range(slots)]
+        self.slot_glyph = [None] * slots     # (framebuffer, width, advance)
+        self.slot_char = array("h", [-1] * slots)
+        self.slot_used = array("i", [0] * slots)
+        self.cached = {}                     # char code -> slot
+        self.uses = 0
+
+        # drawing colour goes through a 2 pixel palette: 0 -> key, 1 -> colour
+        self.palette = framebuf.FrameBuffer(bytearray(4), 2, 1, framebuf.RGB565)
+
+    def _check(self, path):
+        # read header and glyph table, ValueError for a truncated or
+        # foreign file so nothing fails later while drawing
+        f = self.file
+        header = f.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE:
+            raise ValueError("truncated font atlas: %s" % path)
+        magic, self.height, self.first, self.count, self.max_width = struct.unpack(
+            HEADER, header)
+        if magic != MAGIC:
+            raise ValueError("not a font atlas: %s" % path)
+        self.table = f.read(self.count * ENTRY_SIZE)
+        if len(self.table) != self.count * ENTRY_SIZE or not self.height:
+            raise ValueError("truncated font atlas: %s" % path)
+        if self.first > ord("?") or ord("?") - self.first >= self.count:
+            raise ValueError("font atlas without '?': %s" % path)
+        size = f.seek(0, 2)
+        for index in range(self.count):
+            offset, width, _ = struct.unpack_from(ENTRY, self.table, index * ENTRY_SIZE)
+            if width > self.max_width or offset + (width + 7) // 8 * self.height > size:
+                raise ValueError("truncated font atlas: %s" % path)
+
+    def close(self):
+        self.file.close()
+
+    def _entry(self, code):
+        index = code - self.first
+        if index < 0 or index >= self.count:
+            index = ord("?") - self.first
+        return struct.unpack_from(ENTRY, self.table, index * ENTRY_SIZE)
+
+    def _load(self, code):
+        # evict the least recently used slot and read the glyph into it
+        slot = 0
+        for i in range(1, len(self.slot_used)):
+            if self.slot_used[i] < self.slot_used[slot]:
+                slot = i
+        old = self.slot_char[slot]
+        if old >= 0:
+            del self.cached[old]
+
+        offset, width, advance = self._entry(code)
+        size = (width + 7) // 8 * self.height
+        view = self.slot_views[slot][:size]
+        self.file.seek(offset)
+        self.file.readinto(view)
+        fb = None
+        if width:
+            fb = framebuf.FrameBuffer(view, width, self.height, framebuf.MONO_HLSB)
+        self.slot_glyph[slot] = (fb, width, advance)
+        self.slot_char[slot] = code
+        self.cached[code] = slot
+        return slot
+
+    def glyph(self, code):
+        slot = self.cached.get(code)
+        if slot is None:
+            slot = self._load(code)
+        self.uses += 1
+        self.slot_used[slot] = self.uses
+        return self.slot_glyph[slot]
+
+    def measure(self, text):
+        width = 0
+        for char in text:
+            width += self._entry(ord(char))[2]
+        return width
+
+    def text(self, target, text, x, y, color):
+        key = color ^ 0xFFFF
+        palette = self.palette
+        palette.pixel(0, 0, key)
+        palette.pixel(1, 0, color)
+        for char in text:
+            fb, width, advance = self.glyph(ord(char))
+            if fb is not None:
+                target.blit(fb, x, y, key, palette)
+            x += advance
+        return x
@@ -0,0 +1,75 @@
+import gc
+from array import array
+
+from clock import CLOCK
+
+# Allocation watchdog for the session loop.
+# The breathing animation is supposed to run without touching the heap, so
+# every byte allocated per frame is a regression. Enable GC_DEBUG in main.py
+# to record per frame how much the heap grew and how long collections took.
+# All storage is preallocated, recording a frame does not allocate itself.
+
+
+class GcMonitor:
+
+    def __init__(self, size=128, clock=None):
+        self.size = size
+        self.clock = clock or CLOCK
+        self.deltas = array("i", [0] * size)   # heap growth per frame [bytes]
+        self.pauses = array("i", [0] * size)   # collection pauses [us]
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.allocating_frames = 0
+        self.allocated = 0
+        self.max_delta = 0
+        self.collections = 0
+        self.auto_collections = 0
+        self.max_pause_us = 0
+        self.total_pause_us = 0
+        self._last_alloc = gc.mem_alloc()
+        self._last_us = self.clock.ticks_us()
+
+    def _record_pause(self, pause_us):
+        self.pauses[self.collections % self.size] = pause_us
+        self.collections += 1
+        self.total_pause_us += pause_us
+        if pause_us > self.max_pause_us:
+            self.max_pause_us = pause_us
+
+    def frame(self):
+        now = self.clock.ticks_us()
+        alloc = gc.mem_alloc()
+        delta = alloc - self._last_alloc
+        if delta < 0:
+            # the heap shrank, so an automatic collection ran during the
+            # frame; the frame time is an upper bound for its pause
+            self.auto_collections += 1
+            self._record_pause(self.clock.ticks_diff(now, self._last_us))
+            delta = 0
+        elif delta > 0:
+            self.allocating_frames += 1
+            self.allocated += delta
+            if delta > self.max_delta:
+                self.max_delta = delta
+        self.deltas[self.frames % self.size] = delta
+        self.frames += 1
+        self._last_alloc = gc.mem_alloc()
+        self._last_us = self.clock.ticks_us()
+
+    def collect(self):
+        start = self.clock.ticks_us()
+        gc.collect()
+        self._record_pause(self.clock.ticks_diff(self.clock.ticks_us(), start))
+        self._last_alloc = gc.mem_alloc()
+        self._last_us = self.clock.ticks_us()
+
+    def report(self):
+        mean_pause = self.total_pause_us // self.collections if self.collections else 0
+        print("gc: frames %d, allocating %d, allocated %d bytes, max %d bytes/frame"
+              % (self.frames, self.allocating_frames, self.allocated, self.max_delta))
+        print("gc: collections %d (%d automatic), pause mean %d us, max %d us"
+              % (self.collections, self.auto_collections, mean_pause, self.max_pause_us))
+        if self.allocating_frames:
+            print("gc: WARNING session loop allocates")
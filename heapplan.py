@@ -0,0 +1,95 @@
+import gc
+from array import array
+
+try:
+    from gc import mem_alloc, mem_free
+except ImportError:
+    mem_alloc = mem_free = None
+
+try:
+    from uctypes import addressof
+except ImportError:
+    addressof = id
+
+# Boot time memory plan for the large buffers.
+# The panel framebuffer alone is one contiguous 25.6 KB (0.96") or 64.8 KB
+# (1.14") block. Allocated late, after the heap has been cut up by imports
+# and small objects, it may not fit although enough memory is free in
+# total. So every large buffer is reserved here right at boot, in a fixed
+# order of categories, and handed to its owner through a buffer= argument.
+# reserve() fails early with a message naming the buffer that did not fit,
+# check() makes sure enough headroom is left for everything else.
+
+FRAMEBUFFER = 0
+LOG = 1
+SENSOR = 2
+CATEGORIES = ("framebuffer", "log", "sensor")
+
+ITEM_SIZE = {"b": 1, "B": 1, "h": 2, "H": 2, "i": 4, "I": 4, "l": 4, "L": 4, "f": 4}
+
+# free heap needed after the plan for fonts, menus, settings and the session
+MIN_FREE = 16 * 1024
+
+
+class HeapPlan:
+
+    def __init__(self):
+        self.entries = []   # (category, name, buffer, size in bytes)
+        self.category = FRAMEBUFFER
+        self.total = 0
+
+    def reserve(self, category, name, count, typecode=None):
+        # a zeroed bytearray of count bytes, or a zeroed array of count items
+        if category < self.category:
+            raise ValueError("heap plan: %s buffer %s reserved after %s buffers"
+                             % (CATEGORIES[category], name, CATEGORIES[self.category]))
+        self.category = category
+        gc.collect()
+        size = count * ITEM_SIZE[typecode] if typecode else count
+        try:
+            if typecode is None:
+                buffer = bytearray(count)
+            else:
+                # raw copy of zero bytes, no per item objects and no range
+                # of values that must fit the typecode
+                buffer = array(typecode, bytes(size))
+        except MemoryError:
+            raise MemoryError("heap plan: no room for %s (%s, %d items) after %d bytes planned, "
+                              "%s bytes free; turn features off in main.py"
+                              % (name, CATEGORIES[category], count, self.total,
+                                 mem_free() if mem_free else "?"))
+        self.entries.append((category, name, buffer, size))
+        self.total += size
+        return buffer
+
+    def check(self, min_free=MIN_FREE):
+        if mem_free is None:
+            return
+        gc.collect()
+        if mem_free() < min_free:
+            self.report()
+            raise MemoryError("heap plan: only %d bytes free after the plan, %d needed; "
+                              "turn features off in main.py" % (mem_free(), min_free))
+
+    def report(self):
+        print("heap plan: %d buffers, %d bytes" % (len(self.entries), self.total))
+        for category, name, buffer, size in self.entries:
+            print("  %08x %7d  %-11s %s" % (addressof(buffer), size, CATEGORIES[category], name))
+        if mem_free is not None:
+            gc.collect()
+            print("heap: %d used, %d free" % (mem_alloc(), mem_free()))
+
+
+PLAN = HeapPlan()
+
+
+def reserve(category, name, count, typecode=None):
+    return PLAN.reserve(category, name, count, typecode)
+
+
+def check(min_free=MIN_FREE):
+    PLAN.check(min_free)
+
+
+def report():
+    PLAN.report()
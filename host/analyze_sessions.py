@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# Fleet analysis of exported session logs (sessionlog.py), needs NumPy.
+#
+# usage:
+#   python3 host/analyze_sessions.py logs/                 every *.bin in the folder
+#   python3 host/analyze_sessions.py a.bin b.bin --users 50
+#
+# Every file is memory mapped as an array of fixed size records, the filled
+# slots of all files are joined into one structured array and everything
+# after that is column arithmetic: presets are matched for all records at
+# once, group statistics use masks and percentiles, per user trends are
+# least squares slopes computed for all users together with bincount.
+# Trends run over weeks for users whose pico clock was set for every
+# session (by Thonny or mpremote) and over their own session sequence,
+# per 10 sessions, for standalone devices whose RTC restarts at 2021.
+# host/simulate.py --log writes test logs for any number of made-up devices.
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import boards
+import sessionlog
+from simulate import PRESETS
+
+# board byte of a record is the index into boards.BOARDS
+BOARDS = tuple(board[0] for board in boards.BOARDS)
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S4"),
+    ("record_size", "<u2"),
+    ("capacity", "<u2"),
+    ("next_sequence", "<u4"),
+    ("pad", "V4"),
+])
+
+RECORD_DTYPE = np.dtype([
+    ("sequence", "<u4"),
+    ("timestamp", "<u4"),
+    ("version", "u1"),
+    ("board", "u1"),
+    ("device", ">u8"),      # unique_id bytes in order, prints like .hex()
+    ("in", "u1"),
+    ("hold", "u1"),
+    ("out", "u1"),
+    ("stay", "u1"),
+    ("minutes", "u1"),
+    ("cycles", "<u2"),
+    ("length_ms", "<u4"),
+    ("phases", "<u2"),
+    ("max_drift_ms", "<i4"),
+    ("mean_error_us", "<i4"),
+    ("max_error_ms", "<i4"),
+    ("mean_tone_us", "<i4"),
+    ("max_tone_us", "<i4"),
+    ("overrun_ms", "<i4"),
+    ("adherence", "u1"),
+    ("heart_rate", "u1"),
+    ("completed", "u1"),
+    ("clock_set", "u1"),
+    ("pad", "V5"),
+])
+
+assert HEADER_DTYPE.itemsize == sessionlog.HEADER_SIZE
+assert RECORD_DTYPE.itemsize == sessionlog.RECORD_SIZE
+
+
+def log_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".bin"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def load(paths):
+    # all filled records of all files, ordered by device and sequence
+    parts = []
+    for path in log_files(paths):
+        header = np.fromfile(path, HEADER_DTYPE, count=1)
+        if (len(header) != 1 or header["magic"][0] != sessionlog.MAGIC
+                or header["record_size"][0] != sessionlog.RECORD_SIZE):
+            print("skipping %s: not a session log" % path, file=sys.stderr)
+            continue
+        count = (os.path.getsize(path) - sessionlog.HEADER_SIZE) // sessionlog.RECORD_SIZE
+        if count <= 0:
+            continue
+        records = np.memmap(path, RECORD_DTYPE, mode="r", offset=sessionlog.HEADER_SIZE,
+                            shape=(count,))
+        parts.append(records[records["sequence"] != 0])
+    if not parts:
+        return np.zeros(0, RECORD_DTYPE)
+    data = np.concatenate(parts)
+    return data[np.lexsort((data["sequence"], data["device"]))]
+
+
+def preset_index(data):
+    # index into preset_labels() per record, the last label is "custom"
+    names = sorted(PRESETS)
+    table = np.array([PRESETS[name] for name in names], dtype=np.uint8)
+    half = np.stack([data["in"], data["hold"], data["out"], data["stay"]], axis=1)
+    match = (half[:, None, :] == table[None, :, :]).all(axis=2)
+    return np.where(match.any(axis=1), match.argmax(axis=1), len(names))
+
+
+def preset_labels():
+    return sorted(PRESETS) + ["custom"]
+
+
+def board_labels():
+    return list(BOARDS) + ["unknown"]
+
+
+def board_index(data):
+    board = data["board"].astype(np.intp)
+    return np.where(board < len(BOARDS), board, len(BOARDS))
+
+
+def timing_table(title, groups, labels, data):
+    # distribution of the timing errors per group
+    error_ms = data["mean_error_us"] / 1000.0
+    minutes = np.maximum(data["length_ms"], 1) / 60000.0
+    drift_per_min = data["max_drift_ms"] / minutes
+    tone_ms = data["mean_tone_us"] / 1000.0
+    overrun = data["overrun_ms"].astype(np.float64)
+
+    print()
+    print("%-9s %7s | boundary error [ms]      | drift [ms/min]    | tone [ms] | overrun [ms]"
+          % (title, "sessions"))
+    print("%-9s %7s | %6s %6s %6s %6s | %6s %6s %6s | %9s | %6s %6s"
+          % ("", "", "mean", "p50", "p95", "max", "mean", "p95", "max", "mean", "mean", "p95"))
+    for index, label in enumerate(labels):
+        mask = groups == index
+        count = int(mask.sum())
+        if not count:
+            continue
+        e = error_ms[mask]
+        d = drift_per_min[mask]
+        o = overrun[mask]
+        p50, p95 = np.percentile(e, [50, 95])
+        print("%-9s %7d | %6.1f %6.1f %6.1f %6.1f | %6.1f %6.1f %6.1f | %9.1f | %6.0f %6.0f"
+              % (label, count, e.mean(), p50, p95, e.max(), d.mean(), np.percentile(d, 95),
+                 d.max(), tone_ms[mask].mean(), o.mean(), np.percentile(o, 95)))
+
+
+def slopes(group, x, y, weight, groups):
+    # least squares slope of y over x per group, NaN with fewer than 2 points
+    n = np.bincount(group, weight, groups)
+    sx = np.bincount(group, weight * x, groups)
+    sy = np.bincount(group, weight * y, groups)
+    sxx = np.bincount(group, weight * x * x, groups)
+    sxy = np.bincount(group, weight * x * y, groups)
+    denominator = n * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where((n >= 2) & (denominator > 0), (n * sxy - sx * sy) / denominator, np.nan)
+
+
+def user_table(data, limit):
+    devices, user = np.unique(data["device"], return_inverse=True)
+    users = len(devices)
+    timestamp = data["timestamp"].astype(np.float64)
+    # records are sorted by device, so every user is one contiguous block
+    starts = np.flatnonzero(np.r_[True, np.diff(user) != 0])
+    first = np.minimum.reduceat(timestamp, starts)
+    last = np.maximum.reduceat(timestamp, starts)
+    # version 1 records predate the flag and were all written with the clock set
+    clock_set = (data["clock_set"] != 0) | (data["version"] < 2)
+    wall = np.bincount(user, (~clock_set).astype(np.float64), users) == 0
+    weeks = (timestamp - first[user]) / (7 * 86400.0)
+    index = np.arange(len(data)) - starts[user]
+    x = np.where(wall[user], weeks, index / 10.0)
+
+    ones = np.ones(len(data))
+    sessions = np.bincount(user, minlength=users)
+    minutes = data["length_ms"] / 60000.0
+    completed = np.bincount(user, data["completed"].astype(np.float64), users) / sessions
+    mean_minutes = np.bincount(user, minutes, users) / sessions
+    minutes_trend = slopes(user, x, minutes, ones, users)
+
+    tracked = (data["adherence"] != sessionlog.NO_ADHERENCE).astype(np.float64)
+    adherence = data["adherence"].astype(np.float64)
+    tracked_count = np.bincount(user, tracked, users)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_adherence = np.bincount(user, tracked * adherence, users) / tracked_count
+    adherence_trend = slopes(user, x, adherence, tracked, users)
+    board = board_index(data)[starts]
+
+    order = np.argsort(-sessions, kind="stable")[:limit]
+    print()
+    print("%-16s %-8s %8s %6s %6s %8s %9s %9s %9s %-7s"
+          % ("user (device)", "board", "sessions", "weeks", "done%", "min/sess",
+             "min trend", "adherence", "adh trend", "per"))
+    labels = board_labels()
+    for i in order:
+        print("%016x %-8s %8d %6s %6.0f %8.1f %+9.2f %9s %9s %-7s"
+              % (devices[i], labels[board[i]], sessions[i],
+                 "%.1f" % ((last[i] - first[i]) / (7 * 86400.0)) if wall[i] else "-",
+                 100 * completed[i], mean_minutes[i], np.nan_to_num(minutes_trend[i]),
+                 "-" if np.isnan(mean_adherence[i]) else "%.0f%%" % mean_adherence[i],
+                 "-" if np.isnan(adherence_trend[i]) else "%+.1f" % adherence_trend[i],
+                 "week" if wall[i] else "10 sess"))
+    standalone = int(users - wall.sum())
+    if standalone:
+        print("%d users without a set clock, their trends run per 10 sessions" % standalone)
+    if users > limit:
+        print("... %d more users" % (users - limit))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze exported pico breathing coach session logs")
+    parser.add_argument("paths", nargs="+", help="session log files or folders of them")
+    parser.add_argument("--users", type=int, default=20, help="users to list, most active first")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    data = load(args.paths)
+    if not len(data):
+        print("no sessions found")
+        return 1
+    print("%d sessions from %d users, %.1f h of breathing"
+          % (len(data), len(np.unique(data["device"])), data["length_ms"].sum() / 3600000.0))
+
+    timing_table("preset", preset_index(data), preset_labels(), data)
+    timing_table("backend", board_index(data), board_labels(), data)
+    user_table(data, args.users)
+    print()
+    print("analyzed in %.2f s" % (time.time() - start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
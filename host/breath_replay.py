@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# Host replay of the breath sound adherence tracking in breathsound.py.
+#
+# usage:
+#   python3 host/breath_replay.py recording.wav [--preset box] [--minutes 2]
+#       runs a session on a simulated clock and feeds the recording in as
+#       the microphone signal, as if it had been captured during that session
+#   python3 host/breath_replay.py --synthetic [--lag-ms 400] [--compliance 0.8]
+#       same with generated breath noise that follows the cues with the
+#       given delay, skipping a breath now and then
+#   --frame-ms 600 slows the simulated frames down until the sample ring
+#   (--ring, BREATH_RING in main.py) overflows, to see the tracker cope
+#
+# WAV files are reduced to 1 kHz by keeping every n-th sample, like the
+# ADC sees them without an anti-aliasing filter.
+
+import argparse
+import os
+import random
+import sys
+import wave
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from adcring import RecordedSource
+from breathsound import BreathTracker, RATE_HZ
+from clock import SimClock
+from lib import Mode
+from session import Session
+from simulate import PRESETS, SimBackend, TONE_MODES, make_settings
+import telemetry
+
+
+def read_wav(path, rate_hz=RATE_HZ):
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError("%s: only 16 bit WAV files are supported" % path)
+        channels = f.getnchannels()
+        step = max(1, f.getframerate() // rate_hz)
+        frames = array("h", f.readframes(f.getnframes()))
+    if sys.byteorder == "big":
+        frames.byteswap()
+    # first channel, every step-th frame, shifted to the unsigned ADC range
+    return array("H", (x + 32768 for x in frames[::channels * step]))
+
+
+class SyntheticBreath(RecordedSource):
+    # AdcRing stand-in producing microphone noise in step with a SimClock.
+    # Breathing is audible lag_ms after each IN and OUT cue, as read from the
+    # tones the session played on the backend.
+
+    def __init__(self, clock, backend, rate_hz=RATE_HZ, lag_ms=300, compliance=1.0,
+                 level=3000, noise=150, seed=1, capacity=None):
+        self.backend = backend
+        self.lag_ms = lag_ms
+        self.compliance = compliance
+        self.level = level
+        self.noise = noise
+        self.rng = random.Random(seed)
+        RecordedSource.__init__(self, (), rate_hz, clock, capacity)
+        self.limit = 1 << 62
+
+    def start(self):
+        RecordedSource.start(self)
+        self.cue = -1
+        self.breathing = False
+
+    def _update_cue(self, t_ms):
+        # follow the latest cue that is at least lag_ms old
+        tones = self.backend.tones
+        cue = self.cue
+        while cue + 1 < len(tones) and tones[cue + 1][0] + self.lag_ms <= t_ms:
+            cue += 1
+            mode = TONE_MODES.get(tones[cue][1])
+            active = mode in (Mode.IN, Mode.OUT)
+            self.breathing = active and self.rng.random() < self.compliance
+        self.cue = cue
+
+    def _value(self, index):
+        t_ms = (self.start_us // 1000) + index * 1000 // self.rate_hz
+        self._update_cue(t_ms)
+        amplitude = self.level if self.breathing else self.noise
+        value = 32768 + self.rng.randint(-amplitude, amplitude)
+        return max(0, min(65535, value))
+
+
+def run(args, make_source):
+    settings = make_settings(PRESETS[args.preset], args.minutes)
+    clock = SimClock()
+    flush_us = args.frame_ms * 1000 * 3 // 4
+    backend = SimBackend(clock, args.frame_ms * 1000 - flush_us, flush_us)
+    tracker = BreathTracker(make_source(clock, backend), RATE_HZ, clock=clock)
+    session = Session(backend, clock=clock, collect=lambda: None, breath=tracker)
+    session.run(settings)
+    tracker.report()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the breath sound tracking on the host")
+    parser.add_argument("recording", nargs="?", help="16 bit WAV file")
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="box")
+    parser.add_argument("--minutes", type=int, default=2)
+    parser.add_argument("--lag-ms", type=int, default=300,
+                        help="synthetic: delay of each breath after its cue")
+    parser.add_argument("--compliance", type=float, default=1.0,
+                        help="synthetic: share of cues that are followed")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--frame-ms", type=int, default=20, help="cost of one simulated frame")
+    parser.add_argument("--ring", type=int, default=512, help="sample ring capacity")
+    args = parser.parse_args(argv)
+
+    telemetry.TELEMETRY.enabled = False
+    if args.recording:
+        samples = read_wav(args.recording)
+        run(args, lambda clock, backend: RecordedSource(samples, RATE_HZ, clock, args.ring))
+    elif args.synthetic:
+        run(args, lambda clock, backend: SyntheticBreath(
+            clock, backend, lag_ms=args.lag_ms, compliance=args.compliance, seed=args.seed,
+            capacity=args.ring))
+    else:
+        parser.error("give a recording or --synthetic")
+
+
+if __name__ == "__main__":
+    main()
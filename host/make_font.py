@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Builds a glyph atlas for fontatlas.py from a TrueType font (needs Pillow).
+#
+# usage:
+#   python3 host/make_font.py DejaVuSans.ttf 16 font_16.bin
+#
+# Copy the result to the pico; lcd.draw_text() picks up font_<height>.bin
+# for text drawn with scale > 1 (height = 8 * scale).
+
+import argparse
+import struct
+
+from PIL import Image, ImageDraw, ImageFont
+
+MAGIC = b"FNT1"
+HEADER = "<4sBBBB"
+ENTRY = "<IBB"
+ENTRY_SIZE = 6
+
+
+def render_glyph(font, char, height, ascent):
+    advance = int(round(font.getlength(char)))
+    left, _, right, _ = font.getbbox(char)
+    width = max(0, min(255, max(right, advance) - min(left, 0)))
+    if width == 0 or char.isspace():
+        return 0, advance, b""
+    image = Image.new("1", (width, height), 0)
+    ImageDraw.Draw(image).text((-min(left, 0), ascent), char, font=font, fill=1, anchor="ls")
+    stride = (width + 7) // 8
+    rows = bytearray(stride * height)
+    pixels = image.load()
+    for y in range(height):
+        for x in range(width):
+            if pixels[x, y]:
+                rows[y * stride + x // 8] |= 0x80 >> (x % 8)
+    return width, advance, bytes(rows)
+
+
+def build(path, height, first=32, last=126):
+    font = ImageFont.truetype(path, height)
+    ascent, descent = font.getmetrics()
+    # scale the baseline so ascent and descent fit into the cell
+    baseline = round(height * ascent / float(ascent + descent))
+    glyphs = [render_glyph(font, chr(code), height, baseline) for code in range(first, last + 1)]
+
+    count = len(glyphs)
+    max_width = max(width for width, _, _ in glyphs)
+    header = struct.pack(HEADER, MAGIC, height, first, count, max_width)
+    offset = len(header) + count * ENTRY_SIZE
+    table = bytearray()
+    bitmaps = bytearray()
+    for width, advance, bitmap in glyphs:
+        table += struct.pack(ENTRY, offset + len(bitmaps), width, min(advance, 255))
+        bitmaps += bitmap
+    return header + table + bitmaps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a fontatlas.py glyph atlas from a TrueType font")
+    parser.add_argument("ttf")
+    parser.add_argument("height", type=int, help="cell height in pixels")
+    parser.add_argument("output")
+    parser.add_argument("--first", type=int, default=32)
+    parser.add_argument("--last", type=int, default=126)
+    args = parser.parse_args(argv)
+
+    data = build(args.ttf, args.height, args.first, args.last)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print("%s: %d glyphs, %d bytes" % (args.output, args.last - args.first + 1, len(data)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# Host viewer for the display mirror stream written by mirror.py.
+#
+# usage:
+#   python3 host/mirror_viewer.py /dev/ttyACM0          live window (tkinter, pyserial)
+#   python3 host/mirror_viewer.py capture.bin --out frames/
+#       writes every received frame as frames/frame_00001.ppm
+#   python3 host/mirror_viewer.py --demo [--preset box] [--minutes 1]
+#       runs a session on a simulated clock against a headless framebuffer,
+#       mirrors it through mirror.Mirror and checks that every decoded
+#       frame equals the framebuffer; prints the bandwidth used
+#
+# Set MIRROR = True in lcd.py to make the pico send the stream. Telemetry
+# records and console text in the same stream are skipped.
+
+import argparse
+import io
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mirror import (FRAME_END, FRAME_START, HEADER, HEADER_SIZE, ROW_RAW, ROW_RLE, SYNC,
+                    Mirror)
+
+KINDS = (FRAME_START, ROW_RLE, ROW_RAW, FRAME_END)
+
+
+class MirrorDecoder:
+    # rebuilds the framebuffer from the packets
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.width = self.height = 0
+        self.scale = 1
+        self.pixels = bytearray()
+        self.bad_packets = 0
+
+    def feed(self, data):
+        # yields the frame number at the end of every complete frame
+        self.buffer += data
+        buf = self.buffer
+        i = 0
+        while i < len(buf):
+            if buf[i] != SYNC:
+                i += 1
+                continue
+            if len(buf) - i < HEADER_SIZE + 1:
+                break
+            _, kind, a, b = struct.unpack_from(HEADER, buf, i)
+            length = 1 if kind == FRAME_START else (b if kind in (ROW_RLE, ROW_RAW) else 0)
+            end = i + HEADER_SIZE + length
+            if kind not in KINDS or length > 2 * 0xFFFF:
+                self.bad_packets += 1
+                i += 1
+                continue
+            if len(buf) <= end:
+                break
+            if sum(buf[i:end]) & 0xFF != buf[end]:
+                # not a packet after all, resync on the next byte
+                self.bad_packets += 1
+                i += 1
+                continue
+            payload = buf[i + HEADER_SIZE:end]
+            i = end + 1
+            if kind == FRAME_START:
+                self._start(a, b, payload[0])
+            elif kind == ROW_RLE:
+                self._row(a, decode_rle(payload))
+            elif kind == ROW_RAW:
+                self._row(a, payload)
+            elif kind == FRAME_END:
+                yield a
+        del buf[:i]
+
+    def _start(self, width, height, scale):
+        if (width, height) != (self.width, self.height):
+            self.pixels = bytearray(width * height * 2)
+        self.width, self.height, self.scale = width, height, scale
+
+    def _row(self, row, data):
+        row_bytes = self.width * 2
+        if row < self.height and len(data) == row_bytes:
+            self.pixels[row * row_bytes:(row + 1) * row_bytes] = data
+
+    def ppm(self, zoom=1):
+        # the current frame as binary PPM, scaled up by scale * zoom
+        factor = self.scale * zoom
+        rgb = bytearray()
+        for y in range(self.height):
+            line = bytearray()
+            for x in range(self.width):
+                o = (y * self.width + x) * 2
+                pixel = self.pixels[o] << 8 | self.pixels[o + 1]
+                r = (pixel >> 11) << 3
+                g = ((pixel >> 5) & 0x3F) << 2
+                b = (pixel & 0x1F) << 3
+                line += bytes((r, g, b)) * factor
+            rgb += bytes(line) * factor
+        header = b"P6 %d %d 255\n" % (self.width * factor, self.height * factor)
+        return header + bytes(rgb)
+
+
+def decode_rle(payload):
+    row = bytearray()
+    for i in range(0, len(payload) - 2, 3):
+        row += payload[i + 1:i + 3] * payload[i]
+    return row
+
+
+class HeadlessFrameBuffer:
+    # the part of framebuf.FrameBuffer (RGB565) the LCD render uses
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.buffer = bytearray(width * height * 2)
+
+    def fill_rect(self, x, y, w, h, color):
+        x0, x1 = max(0, x), min(self.width, x + w)
+        if x1 <= x0:
+            return
+        pixel = bytes((color & 0xFF, color >> 8)) * (x1 - x0)
+        for row in range(max(0, y), min(self.height, y + h)):
+            start = (row * self.width + x0) * 2
+            self.buffer[start:start + len(pixel)] = pixel
+
+
+def run_demo(args):
+    from clock import SimClock
+    from lib import Mode, PROGRESS_MAX
+    from session import Session
+    from simulate import PRESETS, SimBackend, make_settings
+    import palette
+    import telemetry
+
+    telemetry.TELEMETRY.enabled = False
+    scale = args.scale
+    canvas = HeadlessFrameBuffer(160 // scale, 80 // scale)
+    stream = io.BytesIO()
+    mirror = Mirror(160, 80, stream=stream)
+    decoder = MirrorDecoder()
+    ramps = palette.build(palette.lcd_pen)
+    stats = {"frames": 0, "mismatches": 0, "bytes": 0}
+
+    class MirroredBackend(SimBackend):
+        # SimBackend drawing the 0.96" LCD bars into the headless canvas
+
+        def render(self, progress, mode):
+            super().render(progress, mode)
+            color = palette.color_at(ramps[mode], progress)
+            w, h = canvas.width, canvas.height
+            if mode == Mode.IN:
+                canvas.fill_rect(0, 0, max(1, progress * w // PROGRESS_MAX), h, color)
+            elif mode == Mode.HOLD:
+                canvas.fill_rect(0, 0, w, h, color)
+            elif mode == Mode.OUT:
+                radius = max(1, (PROGRESS_MAX - progress) * w // PROGRESS_MAX)
+                canvas.fill_rect(0, 0, radius, h, color)
+                canvas.fill_rect(radius, 0, w - radius, h, 0)
+            else:
+                canvas.fill_rect(0, 0, w, h, 0)
+
+        def flush(self):
+            super().flush()
+            mirror.frame(canvas.buffer, canvas.width, canvas.height, scale)
+            data = stream.getvalue()
+            stream.seek(0)
+            stream.truncate()
+            stats["bytes"] += len(data)
+            for _ in decoder.feed(data):
+                stats["frames"] += 1
+                if decoder.pixels != canvas.buffer:
+                    stats["mismatches"] += 1
+
+    clock = SimClock()
+    session = Session(MirroredBackend(clock), clock=clock, collect=lambda: None)
+    session.run(make_settings(PRESETS[args.preset], args.minutes))
+
+    frames = stats["frames"]
+    raw = len(canvas.buffer)
+    print("%d frames mirrored, %d differ from the framebuffer, %d bad packets"
+          % (frames, stats["mismatches"], decoder.bad_packets))
+    print("%.0f bytes per frame on average, %d raw (%.1f%%), %.1f kB/s at %d fps"
+          % (stats["bytes"] / float(frames), raw, 100.0 * stats["bytes"] / (frames * raw),
+             stats["bytes"] / float(frames) * args.fps / 1000.0, args.fps))
+    return 1 if stats["mismatches"] else 0
+
+
+def open_source(path, baudrate):
+    if path == "-":
+        return sys.stdin.buffer
+    if path.startswith("/dev/") or path.upper().startswith("COM"):
+        import serial
+        return serial.Serial(path, baudrate, timeout=0.05)
+    return open(path, "rb")
+
+
+def run_files(decoder, source, out):
+    os.makedirs(out, exist_ok=True)
+    while True:
+        data = source.read(4096)
+        if not data:
+            if hasattr(source, "in_waiting"):
+                continue
+            break
+        for number in decoder.feed(data):
+            path = os.path.join(out, "frame_%05d.ppm" % number)
+            with open(path, "wb") as f:
+                f.write(decoder.ppm())
+
+
+def run_window(decoder, source, zoom):
+    import tkinter
+
+    root = tkinter.Tk()
+    root.title("pico mirror")
+    label = tkinter.Label(root)
+    label.pack()
+
+    def poll():
+        data = source.read(4096)
+        shown = None
+        for number in decoder.feed(data or b""):
+            shown = number
+        if shown is not None:
+            image = tkinter.PhotoImage(data=decoder.ppm(zoom), format="PPM")
+            label.configure(image=image)
+            label.image = image
+            root.title("pico mirror, frame %d" % shown)
+        root.after(1 if data else 20, poll)
+
+    poll()
+    root.mainloop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the pico display mirror stream")
+    parser.add_argument("source", nargs="?", help="serial port, capture file or - for stdin")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--out", help="write frames as PPM files into this folder")
+    parser.add_argument("--zoom", type=int, default=3)
+    parser.add_argument("--demo", action="store_true")
+    parser.add_argument("--preset", default="box")
+    parser.add_argument("--minutes", type=int, default=1)
+    parser.add_argument("--scale", type=int, default=2, choices=(1, 2, 4),
+                        help="demo: RENDER_SCALE of the simulated LCD")
+    parser.add_argument("--fps", type=int, default=50, help="demo: frame rate for the bandwidth")
+    args = parser.parse_args(argv)
+
+    if args.demo:
+        return run_demo(args)
+    if not args.source:
+        parser.error("give a source or --demo")
+    decoder = MirrorDecoder()
+    source = open_source(args.source, args.baudrate)
+    try:
+        if args.out:
+            run_files(decoder, source, args.out)
+        else:
+            run_window(decoder, source, args.zoom)
+    except KeyboardInterrupt:
+        pass
+    if decoder.bad_packets:
+        print("%d corrupt packets skipped" % decoder.bad_packets, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
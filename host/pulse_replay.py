@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# Host replay of the PPG pulse pipeline in pulse.py.
+#
+# usage:
+#   python3 host/pulse_replay.py recording.csv [--rate 100]
+#       one ADC reading (0..65535) per line, prints beats and heart rate
+#   python3 host/pulse_replay.py --synthetic --adaptive [--resonance 10.5]
+#       runs full sessions on a simulated clock against a synthetic pulse
+#       whose heart rate swing peaks at the given breathing period and
+#       shows the HRV pacing walking towards it within each session
+
+import argparse
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from adcring import RecordedSource
+from clock import SimClock
+from lib import BreathingSettings
+from pulse import BeatDetector, PulseMonitor, RATE_HZ
+from session import Session
+from simulate import SimBackend
+import telemetry
+
+
+class SyntheticPPG:
+    # AdcRing stand-in producing a pulse wave in step with a SimClock.
+    # The heart rate oscillates with the breathing cycle the session paces
+    # (cycle_hs() in half seconds), the oscillation is strongest when the
+    # cycle length equals resonance_s.
+
+    def __init__(self, clock, cycle_hs, rate_hz=RATE_HZ, resonance_s=10.0,
+                 base_bpm=62.0, max_swing_bpm=10.0, noise=300, seed=1):
+        self.clock = clock
+        self.cycle_hs = cycle_hs
+        self.rate_hz = rate_hz
+        self.resonance_s = resonance_s
+        self.base_bpm = base_bpm
+        self.max_swing_bpm = max_swing_bpm
+        self.noise = noise
+        self.rng = random.Random(seed)
+        self.overruns = 0
+        self.start()
+
+    def start(self):
+        self.k = 0
+        self.start_us = self.clock.ticks_us()
+        self.beat_phase = 0.0
+        self.breath_phase = 0.0
+
+    def stop(self):
+        pass
+
+    def swing_bpm(self, cycle_s):
+        return self.max_swing_bpm * math.exp(-((cycle_s - self.resonance_s) / 2.0) ** 2)
+
+    def pop(self):
+        due = (self.clock.ticks_us() - self.start_us) * self.rate_hz // 1000000
+        if self.k >= due:
+            return -1
+        self.k += 1
+        dt = 1.0 / self.rate_hz
+        cycle_s = self.cycle_hs() / 2.0
+        self.breath_phase = (self.breath_phase + dt / cycle_s) % 1.0
+        bpm = self.base_bpm + self.swing_bpm(cycle_s) * math.sin(2 * math.pi * self.breath_phase)
+        self.beat_phase = (self.beat_phase + dt * bpm / 60.0) % 1.0
+        # systolic peak plus a small dicrotic notch
+        wave = math.exp(-((self.beat_phase - 0.15) / 0.06) ** 2)
+        wave += 0.3 * math.exp(-((self.beat_phase - 0.45) / 0.08) ** 2)
+        value = 30000 + int(8000 * wave) + self.rng.randint(-self.noise, self.noise)
+        return max(0, min(65535, value))
+
+
+def replay_file(path, rate_hz):
+    with open(path) as f:
+        samples = [int(float(line.split(",")[0])) for line in f if line.strip()]
+    source = RecordedSource(samples, rate_hz)
+    detector = BeatDetector(rate_hz)
+    beats = []
+    while True:
+        sample = source.pop()
+        if sample < 0:
+            break
+        ibi = detector.feed(sample)
+        if ibi:
+            beats.append(ibi)
+            print("%8.2f s  ibi %4d ms  %3d bpm"
+                  % (source.position / float(rate_hz), ibi, detector.heart_rate()))
+    if beats:
+        print("%d beats, mean %d bpm, RMSSD %d ms"
+              % (len(beats), 60000 * len(beats) // sum(beats), detector.rmssd()))
+    else:
+        print("no beats detected")
+
+
+def run_sessions(args):
+    settings = BreathingSettings()
+    settings.total_duration = args.minutes
+    clock = SimClock()
+    source = SyntheticPPG(clock, None, resonance_s=args.resonance)
+    monitor = PulseMonitor(source, RATE_HZ, adaptive=args.adaptive)
+    source.cycle_hs = monitor.pacer.cycle_half_seconds
+    session = Session(SimBackend(clock), clock=clock, collect=lambda: None, pulse=monitor)
+    for n in range(args.sessions):
+        session.run(settings)
+        paced = monitor.pacer.half_seconds
+        print("session %d: cycle %.1f s (in %.1f s, out %.1f s), %d bpm, RMSSD %d ms"
+              % (n + 1, monitor.pacer.cycle_half_seconds() / 2.0, paced[0] / 2.0,
+                 paced[2] / 2.0, monitor.detector.heart_rate(), monitor.detector.rmssd()))
+    print("settings kept: in %.1f s, out %.1f s"
+          % (settings.half_seconds_in / 2.0, settings.half_seconds_out / 2.0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the PPG pulse pipeline on the host")
+    parser.add_argument("recording", nargs="?", help="CSV file with one ADC reading per line")
+    parser.add_argument("--rate", type=int, default=RATE_HZ)
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--adaptive", action="store_true", help="enable HRV pacing")
+    parser.add_argument("--resonance", type=float, default=10.5,
+                        help="breathing period with the largest heart rate swing [s]")
+    parser.add_argument("--minutes", type=int, default=5)
+    parser.add_argument("--sessions", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    telemetry.TELEMETRY.enabled = False
+    if args.recording:
+        replay_file(args.recording, args.rate)
+    elif args.synthetic:
+        run_sessions(args)
+    else:
+        parser.error("give a recording or --synthetic")
+
+
+if __name__ == "__main__":
+    main()
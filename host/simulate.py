@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# Faster-than-real-time replay of breathing sessions on the host.
+#
+# Runs session.Session against a simulated backend and clock.SimClock: every
+# rendered frame advances the clock by a fixed cost, idle waits and tones
+# complete instantly. For each session the phase order, the length of every
+# phase and the total session duration are checked against the settings.
+#
+# usage:
+#   python3 host/simulate.py                       sweep random settings
+#   python3 host/simulate.py --count 5000 --frame-ms 25
+#   python3 host/simulate.py --preset box --minutes 10
+#   python3 host/simulate.py --count 2000 --log sessions.bin --devices 20
+#       also writes every session to a sessionlog.py file, spread over the
+#       given number of made-up devices, one session per device and day;
+#       every third device runs standalone with its RTC never set
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from clock import SimClock
+from lib import BreathingSettings, Mode, MODES, get_signal_tone
+from session import Session
+from sessionlog import SessionLog
+import telemetry
+
+PRESETS = {
+    # half seconds in, hold, out, stay as set by the menu in main.py
+    "4-7-8": (8, 14, 16, 0),
+    "box": (8, 8, 8, 8),
+    "gold": (11, 0, 11, 0),
+    "nat": (8, 4, 12, 6),
+}
+
+TONE_MODES = {get_signal_tone(mode): mode for mode in MODES}
+
+RTC_RESET = 1609459200      # 2021-01-01 00:00 UTC, where an unset pico RTC starts
+
+
+class SimBackend:
+    # same surface as lcd.py / pico_explorer.py, renders nothing
+
+    STATIC_MODES = (Mode.HOLD, Mode.STAY)
+    BUTTON_PINS = ()
+
+    def __init__(self, clock, render_us=5000, flush_us=15000):
+        self.clock = clock
+        self.render_us = render_us
+        self.flush_us = flush_us
+        self.frames = 0
+        self.tones = []     # (ticks_ms, frequency)
+
+    def render(self, progress, mode):
+        self.clock.advance_us(self.render_us)
+
+    def flush(self):
+        self.frames += 1
+        self.clock.advance_us(self.flush_us)
+
+    def playtone(self, frequency):
+        self.tones.append((self.clock.ticks_ms(), frequency))
+
+    def bequiet(self):
+        pass
+
+    def button_up(self):
+        return False
+
+    button_down = button_left = button_right = button_up
+
+
+def make_settings(half_seconds, minutes):
+    settings = BreathingSettings()
+    (settings.half_seconds_in, settings.half_seconds_hold,
+     settings.half_seconds_out, settings.half_seconds_stay) = half_seconds
+    settings.total_duration = minutes
+    return settings
+
+
+def check_session(settings, backend, start_ms, tolerance_ms):
+    # returns (problems, max boundary error in ms, session length in ms)
+    problems = []
+    durations = [settings.get_ms(mode) for mode in MODES]
+    active = [mode for mode, ms in zip(MODES, durations) if ms > 0]
+    intended = dict(zip(MODES, durations))
+
+    # the last tone is the end-of-session signal
+    phases = [(t, TONE_MODES[f]) for t, f in backend.tones[:-1]]
+    end_ms = backend.tones[-1][0]
+
+    for n, (_, mode) in enumerate(phases):
+        expected = active[n % len(active)]
+        if mode != expected:
+            problems.append("phase %d is %s, expected %s" % (n, mode, expected))
+            break
+
+    max_error = 0
+    boundaries = [t for t, _ in phases] + [end_ms]
+    for n, (t, mode) in enumerate(phases):
+        error = boundaries[n + 1] - t - intended[mode]
+        max_error = max(max_error, abs(error))
+        if error < 0 or error > tolerance_ms:
+            problems.append("phase %d (%s) lasted %d ms instead of %d ms"
+                            % (n, mode, boundaries[n + 1] - t, intended[mode]))
+
+    if len(phases) % len(active):
+        problems.append("session ended mid cycle after %d phases" % len(phases))
+
+    total_ms = settings.total_duration * 60 * 1000
+    cycle_ms = sum(durations)
+    length = end_ms - start_ms
+    if length < total_ms:
+        problems.append("session ended after %d ms, requested %d ms" % (length, total_ms))
+    if length > total_ms + cycle_ms + tolerance_ms * len(phases):
+        problems.append("session overran: %d ms for %d ms requested" % (length, total_ms))
+
+    return problems, max_error, length
+
+
+def simulate(settings, render_us, flush_us, log=None):
+    clock = SimClock()
+    backend = SimBackend(clock, render_us, flush_us)
+    session = Session(backend, clock=clock, collect=lambda: None, log=log)
+    start_ms = clock.ticks_ms()
+    session.run(settings)
+    return backend, start_ms, session.timing.summary()
+
+
+def random_half_seconds(rng):
+    return (rng.randint(1, 20), rng.randint(0, 20), rng.randint(1, 20), rng.randint(0, 20))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay breathing sessions on a simulated clock")
+    parser.add_argument("--count", type=int, default=500, help="random settings to sweep")
+    parser.add_argument("--preset", choices=sorted(PRESETS), help="replay a single preset")
+    parser.add_argument("--minutes", type=int, default=0,
+                        help="session length, random 1..3 min in sweeps if not given")
+    parser.add_argument("--frame-ms", type=float, default=20.0,
+                        help="simulated render + flush cost per frame")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log", help="append the sessions to this session log file")
+    parser.add_argument("--devices", type=int, default=1, help="devices to spread --log over")
+    args = parser.parse_args(argv)
+
+    # the simulation must not write binary telemetry to the terminal
+    telemetry.TELEMETRY.enabled = False
+
+    frame_us = int(args.frame_ms * 1000)
+    render_us = frame_us // 4
+    flush_us = frame_us - render_us
+    # the end of a phase is noticed up to a frame late and its last frame is
+    # still drawn after that
+    tolerance_ms = 2 * frame_us // 1000 + 1
+
+    rng = random.Random(args.seed)
+    if args.preset:
+        runs = [(PRESETS[args.preset], args.minutes or 10)]
+    else:
+        runs = [(random_half_seconds(rng), args.minutes or rng.randint(1, 3))
+                for _ in range(args.count)]
+
+    logs = []
+    if args.log:
+        # each device gets a board and usually sticks to one preset
+        for n in range(args.devices):
+            log = SessionLog(args.log, board=rng.randrange(3), capacity=0xFFFF,
+                             device=struct.pack(">Q", 0xE660000000000000 + n))
+            logs.append((log, rng.choice(sorted(PRESETS)), n % 3 == 2))
+    timestamp = int(time.time()) - 86400 * (len(runs) // max(1, args.devices))
+
+    wall = time.time()
+    failures = 0
+    simulated_ms = 0
+    frames = 0
+    worst_error = 0
+    worst_drift = 0
+    error_sum_us = 0
+    for n, (half_seconds, minutes) in enumerate(runs):
+        log = None
+        if logs:
+            log, favourite, standalone = logs[n % len(logs)]
+            if not args.preset and rng.random() < 0.7:
+                half_seconds = PRESETS[favourite]
+            if standalone:
+                # unset RTC: every boot starts at 2021-01-01 00:00
+                log.time_s = lambda boot=rng.randint(60, 600): RTC_RESET + boot
+            else:
+                log.time_s = lambda day=n // len(logs): timestamp + 86400 * day
+        settings = make_settings(half_seconds, minutes)
+        backend, start_ms, timing = simulate(settings, render_us, flush_us, log)
+        problems, max_error, length = check_session(settings, backend, start_ms, tolerance_ms)
+        simulated_ms += length
+        frames += backend.frames
+        worst_error = max(worst_error, max_error)
+        worst_drift = max(worst_drift, timing[1])
+        error_sum_us += timing[2]
+        if problems:
+            failures += 1
+            print("FAIL half seconds %s, %d min:" % (half_seconds, minutes))
+            for problem in problems:
+                print("  " + problem)
+
+    wall = time.time() - wall
+    print("%d sessions, %.1f h simulated, %d frames in %.1f s, "
+          "max phase error %d ms, %d failed"
+          % (len(runs), simulated_ms / 3600000.0, frames, wall, worst_error, failures))
+    print("session timing: max drift %d ms, mean boundary error %d us"
+          % (worst_drift, error_sum_us // len(runs)))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
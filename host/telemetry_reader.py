@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# Host side decoder for the telemetry stream written by telemetry.py.
+#
+# usage:
+#   python3 host/telemetry_reader.py /dev/ttyACM0     (needs pyserial)
+#   python3 host/telemetry_reader.py capture.bin
+#   cat capture.bin | python3 host/telemetry_reader.py -
+#
+# Records are printed one per line, regular console output of the pico
+# (prints, tracebacks) is passed through as text.
+
+import argparse
+import struct
+import sys
+
+SYNC = 0xA5
+RECORD = "<BBhI"
+RECORD_SIZE = 9
+
+MODES = ("IN", "HOLD", "OUT", "STAY")
+BUTTONS = ("up", "down", "left", "right")
+
+EVENTS = {
+    1: "session_start",
+    2: "session_end",
+    3: "phase",
+    4: "frames",
+    5: "frame_max_ms",
+    6: "button",
+    7: "saved",
+    8: "dropped",
+    9: "duty_permille",
+    10: "heart_rate",
+    11: "pacing_half_s",
+    12: "adherence_pct",
+    13: "drift_ms",
+    14: "overrun_ms",
+    15: "samples_lost",
+}
+
+
+def format_value(kind, value):
+    if kind == 3 and 0 <= value < len(MODES):
+        return MODES[value]
+    if kind == 6 and 0 <= value < len(BUTTONS):
+        return BUTTONS[value]
+    return str(value)
+
+
+class Decoder:
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.text = bytearray()
+        self.bad_records = 0
+
+    def feed(self, data):
+        # yields ("event", ticks, name, value) and ("text", line) tuples
+        self.buffer += data
+        buf = self.buffer
+        i = 0
+        while i < len(buf):
+            if buf[i] != SYNC:
+                self.text.append(buf[i])
+                if buf[i] == 0x0A:
+                    yield ("text", self.text.decode("utf-8", "replace").rstrip())
+                    self.text.clear()
+                i += 1
+                continue
+            if len(buf) - i < RECORD_SIZE:
+                break
+            record = buf[i:i + RECORD_SIZE]
+            _, kind, value, ticks = struct.unpack_from(RECORD, record)
+            if sum(record[:-1]) & 0xFF != record[-1] or kind not in EVENTS:
+                # not a record after all, treat the byte as noise and resync
+                self.bad_records += 1
+                i += 1
+                continue
+            yield ("event", ticks, EVENTS[kind], format_value(kind, value))
+            i += RECORD_SIZE
+        del buf[:i]
+
+
+def open_source(path, baudrate):
+    if path == "-":
+        return sys.stdin.buffer
+    if path.startswith("/dev/") or path.upper().startswith("COM"):
+        import serial
+        return serial.Serial(path, baudrate, timeout=0.1)
+    return open(path, "rb")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode the pico breathing coach telemetry stream")
+    parser.add_argument("source", help="serial port, capture file or - for stdin")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--events-only", action="store_true",
+                        help="do not echo the console text")
+    args = parser.parse_args(argv)
+
+    decoder = Decoder()
+    source = open_source(args.source, args.baudrate)
+    last_ticks = None
+    try:
+        while True:
+            data = source.read(256)
+            if not data:
+                if hasattr(source, "in_waiting"):
+                    continue
+                break
+            for item in decoder.feed(data):
+                if item[0] == "text":
+                    if not args.events_only and item[1]:
+                        print("# %s" % item[1])
+                    continue
+                _, ticks, name, value = item
+                delta = "" if last_ticks is None else "+%d" % (ticks - last_ticks)
+                last_ticks = ticks
+                print("%10d %8s %-14s %s" % (ticks, delta, name, value))
+    except KeyboardInterrupt:
+        pass
+    if decoder.bad_records:
+        print("# %d corrupt records skipped" % decoder.bad_records, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
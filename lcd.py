@@ -2,25 +2,35 @@ from machine import Pin,SPI,PWM
 import framebuf
 import time
 
-big_screen = False
+import heapplan
+import boards
+
+# 1.14" or 0.96" panel, see boards.py
+big_screen = boards.detect() == boards.LCD_114
 if big_screen:
     import pico_lcd_114 as pico_lcd
-    lcd = pico_lcd.LCD_1inch14()
+    lcd = pico_lcd.LCD_1inch14(buffer=heapplan.reserve(
+        heapplan.FRAMEBUFFER, "lcd 1.14", pico_lcd.LCD_1inch14.WIDTH * pico_lcd.LCD_1inch14.HEIGHT * 2))
     
     LINE_HEIGHT = 10 + 12
     Y_OFFSET = 8
-    def lcd_show():
-        lcd.show()
+    TITLE_SCALE = 2
+    TITLE_EXTRA = 0
 else:
     import pico_lcd_096 as pico_lcd
-    lcd = pico_lcd.LCD_0inch96()
+    lcd = pico_lcd.LCD_0inch96(buffer=heapplan.reserve(
+        heapplan.FRAMEBUFFER, "lcd 0.96", pico_lcd.LCD_0inch96.WIDTH * pico_lcd.LCD_0inch96.HEIGHT * 2))
     
-    LINE_HEIGHT = 10 + 4
+    LINE_HEIGHT = 10 + 3
     Y_OFFSET = 0
-    def lcd_show():
-        lcd.display()
+    TITLE_SCALE = 2
+    # the 16 px title needs more room than one line, the rest moves down
+    TITLE_EXTRA = 4
 
-from lib import Mode
+from lib import Mode, PROGRESS_MAX
+import menucache
+from fontatlas import FontAtlas
+import palette
 
 #color is BGR
 RED = 0x00F8
@@ -31,11 +41,45 @@ BLACK = 0x0000
 
 
 
-def draw_text(text, x, line, scale=4, selected=False):
-    y = Y_OFFSET + line*LINE_HEIGHT
+def line_y(line):
+    return Y_OFFSET + line*LINE_HEIGHT + (TITLE_EXTRA if line else 0)
+
+
+def draw_marker(x, line):
+    lcd.text(">", x - 8, line_y(line), WHITE)
+
+
+# scale 1 is the built-in 8x8 framebuf font, larger scales use a glyph
+# atlas font_<8 * scale>.bin (see fontatlas.py) if it is on the device
+FONTS = {}
+
+def font_file(scale):
+    return "font_%d.bin" % (8 * scale)
+
+
+def get_font(scale):
+    height = 8 * scale
+    if height not in FONTS:
+        try:
+            FONTS[height] = FontAtlas(font_file(scale))
+        except OSError:
+            FONTS[height] = None
+        except ValueError as e:
+            # truncated or corrupt file, keep the built-in font
+            print(e)
+            FONTS[height] = None
+    return FONTS[height]
+
+
+def draw_text(text, x, line, scale=1, selected=False):
+    y = line_y(line)
     if selected:
-        lcd.text(">", x - 8, y, WHITE)
-    lcd.text(text, x, y, RED)
+        draw_marker(x, line)
+    font = get_font(scale) if scale > 1 else None
+    if font is None:
+        lcd.text(text, x, y, RED)
+    else:
+        font.text(lcd, text, x, y, RED)
     return line + 1
     
     
@@ -47,6 +91,9 @@ KEY_CTRL=Pin(3,Pin.IN,Pin.PULL_UP)
 KEY_A=Pin(15,Pin.IN,Pin.PULL_UP)
 KEY_B=Pin(17,Pin.IN,Pin.PULL_UP)
 
+# pins that wake the session from idle
+BUTTON_PINS = (KEY_UP, KEY_DOWN, KEY_LEFT, KEY_RIGHT, KEY_A, KEY_B)
+
 
 def button_up():
     return KEY_UP.value() == 0 or KEY_LEFT.value() == 0
@@ -64,7 +111,24 @@ def clear_display():
     lcd.fill(BLACK)
 
 
-from pimoroni import Buzzer
+try:
+    from pimoroni import Buzzer
+except ImportError:
+    # plain MicroPython firmware: the same square wave from machine.PWM
+    class Buzzer:
+
+        def __init__(self, pin):
+            self.pwm = PWM(Pin(pin))
+            self.pwm.duty_u16(0)
+
+        def set_tone(self, frequency, volume=0.5):
+            if frequency < 1:
+                self.pwm.duty_u16(0)
+                return False
+            self.pwm.freq(int(frequency))
+            self.pwm.duty_u16(int(65535 * volume))
+            return True
+
 BUZZER = Buzzer(0)
 
 def playtone(frequency):            # this function tells your program how to make noise
@@ -74,51 +138,110 @@ def bequiet():                      # this function tells your program how not t
     BUZZER.set_tone(-1)
 
 
-def write_menu(settings, current_selection):
-    
+X_1 = 10
+X_2 = 45
+X_3 = X_2 + X_1 + 30
+X_4 = X_3 + 45
+
+# static part of the menu, (text, x, line, scale); cached in flash by menucache
+MENU_LABELS = (
+    ("Pico Atemcoach ", X_1, 0, TITLE_SCALE),
+    ("Laufzeit:", X_1, 1, 1),
+    ("in", X_1, 2, 1),
+    ("hold", X_3, 2, 1),
+    ("out", X_1, 3, 1),
+    ("keep", X_3, 3, 1),
+    ("4-7-8", X_1, 4, 1),
+    ("box", X_2 + 10, 4, 1),
+    ("gold", X_3 + 5, 4, 1),
+    ("nat", X_4, 4, 1),
+    ("START BREATHING", X_1, 5, 1),
+)
+
+# position of the selection marker per menu entry 1..10
+MENU_MARKERS = (None, (X_1, 1), (X_1, 2), (X_3, 2), (X_1, 3), (X_3, 3),
+                (X_1, 4), (X_2 + 10, 4), (X_3 + 5, 4), (X_4, 4), (X_1, 5))
+
+# the title looks different with and without the atlas, so its state is
+# part of the key: copying font_16.bin over invalidates the cached image
+MENU_CACHE_KEY = "%s_f%d" % ("lcd114" if big_screen else "lcd096",
+                             8 * TITLE_SCALE if get_font(TITLE_SCALE) else 0)
+
+# keep the static menu in flash (menucache.py). Off: framebuf fill() and
+# text() draw it in C faster than LittleFS reads the image back; time both
+# on the board with benchmark.py before turning it on
+MENU_CACHE = False
+
+
+def draw_menu_background():
+    if MENU_CACHE and menucache.load(MENU_CACHE_KEY, lcd.buffer):
+        return
     lcd.fill(BLACK)
-    x_offset = 10
-    x_offset_2 = 45
-    x_offset_3 = x_offset_2 + x_offset + 30
-    x_offset_4 = x_offset_3 + 45
-    line = draw_text("Pico Atemcoach ", x_offset, 0)
-    line = draw_text("Laufzeit:", x_offset, line, selected=current_selection == 1)
-    line = draw_text("%s" % settings.total_duration, 90, line - 1)
-    
-    line = draw_text("in", x_offset, line, selected=current_selection == 2)
-    line = draw_text("%s" % (0.5 * settings.half_seconds_in), x_offset_2, line-1)
-    line = draw_text("hold", x_offset_3, line-1, selected=current_selection == 3)
-    line = draw_text("%s" % (0.5 * settings.half_seconds_hold), x_offset_4, line-1)
-    
-    line = draw_text("out", x_offset, line, selected=current_selection == 4)
-    line = draw_text("%s" % (0.5 * settings.half_seconds_out), x_offset_2, line-1)
-    line = draw_text("keep", x_offset_3, line-1, selected=current_selection == 5)
-    line = draw_text("%s" % (0.5 * settings.half_seconds_stay), x_offset_4, line-1)
-   
-    line = draw_text("4-7-8", x_offset, line, selected=current_selection == 6)
-    line = draw_text("box", x_offset_2 + 10, line-1, selected=current_selection == 7)
-    line = draw_text("gold", x_offset_3 + 5, line-1, selected=current_selection == 8)
-    line = draw_text("nat", x_offset_4, line-1, selected=current_selection == 9)
-
-    line = draw_text("START BREATHING", x_offset, line, selected=current_selection == 10)
-    lcd_show()
-    
+    for text, x, line, scale in MENU_LABELS:
+        draw_text(text, x, line, scale=scale)
+    if MENU_CACHE:
+        menucache.store(MENU_CACHE_KEY, lcd.buffer)
+
+
+def write_menu(settings, current_selection):
+
+    draw_menu_background()
+
+    draw_text("%s" % settings.total_duration, 90, 1)
+    draw_text("%s" % (0.5 * settings.half_seconds_in), X_2, 2)
+    draw_text("%s" % (0.5 * settings.half_seconds_hold), X_4, 2)
+    draw_text("%s" % (0.5 * settings.half_seconds_out), X_2, 3)
+    draw_text("%s" % (0.5 * settings.half_seconds_stay), X_4, 3)
+
+    x, line = MENU_MARKERS[current_selection]
+    draw_marker(x, line)
+    lcd.show()
     
     
-def visualize(progress, mode):
+# phases whose picture does not depend on progress
+STATIC_MODES = (Mode.HOLD, Mode.STAY)
+
+# phase colour per progress step, see palette.py
+RAMPS = palette.build(palette.lcd_pen)
+
+# 1 draws the session at full resolution, 2 or 4 draw it at 1/2 or 1/4 of
+# the panel resolution and scale it up while flushing (ST77xx.show_scaled)
+RENDER_SCALE = 2
+canvas, CANVAS_WIDTH, CANVAS_HEIGHT = lcd.scaled_canvas(RENDER_SCALE)
 
+# send every flushed frame to host/mirror_viewer.py over USB serial
+MIRROR = False
+if MIRROR:
+    from mirror import Mirror
+    lcd.mirror = Mirror(lcd.width, lcd.height)
+
+
+def render(progress, mode):
+
+    color = palette.color_at(RAMPS[mode], progress)
     if mode == Mode.IN:
-        radius = max(1, int(progress * lcd.width))
-        lcd.fill_rect(0, 0, radius, lcd.height, RED)
+        radius = max(1, progress * CANVAS_WIDTH // PROGRESS_MAX)
+        canvas.fill_rect(0, 0, radius, CANVAS_HEIGHT, color)
     elif mode == Mode.HOLD:
-        lcd.fill_rect(0, 0, lcd.width, lcd.height, RED)
+        canvas.fill_rect(0, 0, CANVAS_WIDTH, CANVAS_HEIGHT, color)
     elif mode == Mode.OUT:
-        radius = max(1, int((1-progress) * lcd.width))
-        lcd.fill_rect(radius, 0, radius, lcd.height, BLACK)
+        radius = max(1, (PROGRESS_MAX - progress) * CANVAS_WIDTH // PROGRESS_MAX)
+        canvas.fill_rect(0, 0, radius, CANVAS_HEIGHT, color)
+        canvas.fill_rect(radius, 0, CANVAS_WIDTH - radius, CANVAS_HEIGHT, BLACK)
     elif mode == Mode.STAY:
-        lcd.fill_rect(0, 0, lcd.width, lcd.height, BLACK)
+        canvas.fill_rect(0, 0, CANVAS_WIDTH, CANVAS_HEIGHT, BLACK)
     else:
         raise Exception("Unknown mode")
 
-    lcd_show()
+
+def flush():
+    if RENDER_SCALE == 1:
+        lcd.show()
+    else:
+        lcd.show_scaled(lcd.buffer, CANVAS_WIDTH, CANVAS_HEIGHT, RENDER_SCALE)
+
+
+def visualize(progress, mode):
+    render(progress, mode)
+    flush()
 
@@ -2,97 +2,117 @@
 # It uses code written by Avram Piltch - check out his Tom's Hardware article! https://www.tomshardware.com/uk/how-to/buzzer-music-raspberry-pi-pico
 # You'll need to connect a jumper wire between GPO and AUDIO on the Explorer Base to hear noise.
 
-import time
-
-from picographics import PicoGraphics, DISPLAY_PICO_EXPLORER
-from pimoroni import Button, Analog, Buzzer
 
 from machine import Pin, PWM, Timer
 import math
 
 import json
 import os
-from lib import BreathingSettings, Mode, get_signal_tone
-
-PRODUCTION_MODE = False # LCD
-if PRODUCTION_MODE:
-    from lcd import display, clear_display, write_menu, visualize
-    from lcd import button_up, button_down, button_left, button_right
-    from lcd import BUZZER, playtone, bequiet    
-else: # pico explorer
-    from pico_explorer import display, clear_display, write_menu, visualize
-    from pico_explorer import button_up, button_down, button_left, button_right
-    from pico_explorer import BUZZER, playtone, bequiet
+
+# the backend of the attached board (Explorer or Waveshare LCD), see
+# boards.py; put the board name into board.txt to skip the detection.
+# Loaded before the other modules so its framebuffer, the largest block
+# in heapplan, is reserved while the heap is still empty
+import boards
+backend = boards.load()
+
+import heapplan
+from lib import BreathingSettings
+from gcdebug import GcMonitor
+from profiler import PROFILER
+from clock import CLOCK
+from session import Session
+from sessionlog import SessionLog
+import telemetry
+
+display = backend.display
+clear_display = backend.clear_display
+write_menu = backend.write_menu
+visualize = backend.visualize
+button_up = backend.button_up
+button_down = backend.button_down
+button_left = backend.button_left
+button_right = backend.button_right
+playtone = backend.playtone
+bequiet = backend.bequiet
 
 def any_button_pressed():
     return button_up() or button_down() or button_left() or button_right()
 
 
-playing_flag = False
+# record heap growth and collection pauses of the session loop
+GC_DEBUG = False
+
+# stage timing histograms, cheap enough to stay on; see profiler.report()
+PROFILING = True
+
+# halt the CPU while the picture is static, see power.py
+IDLE_STATIC = True
+
+# PPG pulse sensor on the ADC0 input (GP26), see pulse.py; HRV_PACING lets
+# the IN/OUT durations adapt towards the resonant breathing rate
+PULSE_SENSOR = False
+HRV_PACING = False
+PULSE_PIN = 26
+PULSE_RING = 1024
+
+# microphone on the ADC1 input (GP27) to check that the breathing follows the
+# cues, see breathsound.py
+BREATH_SOUND = False
+BREATH_PIN = 27
+BREATH_RING = 512
+
+# the rest of the large buffers in heapplan order, the framebuffer was
+# reserved by the backend import above
+if BREATH_SOUND:
+    import breathsound
+    breath_log = heapplan.reserve(heapplan.LOG, "breath log",
+                                  breathsound.RECORD_SIZE * breathsound.MAX_CYCLES)
+if PULSE_SENSOR:
+    pulse_ring = heapplan.reserve(heapplan.SENSOR, "pulse ring", PULSE_RING, "H")
+if BREATH_SOUND:
+    breath_ring = heapplan.reserve(heapplan.SENSOR, "breath ring", BREATH_RING, "H")
+
+# append every session to sessions.bin for host/analyze_sessions.py
+SESSION_LOG = True
+
+# binary session events on the USB serial console for
+# host/telemetry_reader.py; they garble the REPL output, so off by default
+SERIAL_TELEMETRY = False
+telemetry.TELEMETRY.enabled = SERIAL_TELEMETRY
+
+pulse_monitor = None
+if PULSE_SENSOR:
+    from adcring import AdcRing
+    from pulse import PulseMonitor, RATE_HZ
+    pulse_monitor = PulseMonitor(AdcRing(PULSE_PIN, RATE_HZ, PULSE_RING, pulse_ring),
+                                 RATE_HZ, adaptive=HRV_PACING)
+
+breath_tracker = None
+if BREATH_SOUND:
+    from adcring import AdcRing
+    breath_tracker = breathsound.BreathTracker(
+        AdcRing(BREATH_PIN, breathsound.RATE_HZ, BREATH_RING, breath_ring),
+        breathsound.RATE_HZ, clock=CLOCK, records=breath_log)
+
+session = Session(
+    backend,
+    clock=CLOCK,
+    profiler=PROFILER if PROFILING else None,
+    gc_monitor=GcMonitor() if GC_DEBUG else None,
+    idle_static=IDLE_STATIC,
+    pulse=pulse_monitor,
+    breath=breath_tracker,
+    log=SessionLog(board=boards.board_index()) if SESSION_LOG else None,
+)
+
+# fail now rather than mid session if the feature set does not fit
+heapplan.report()
+heapplan.check()
 
 def main(settings: BreathingSettings):
-    global playing_flag
-    
-    bequiet()
-    
-    start_time = time.ticks_ms()
-    total_duration_ms = int(settings.total_duration * 60 * 1000)
-    sound_duration_ms = 10
-
-    while True:
-        
-        # make interruptable
-        if any_button_pressed():
-            playing_flag = False
-        if not playing_flag:
-            break
-
-        for mode in [Mode.IN, Mode.HOLD, Mode.OUT, Mode.STAY]:
-            
-            print(mode, settings.get_seconds(mode))
-            current_cycle_length_ms = settings.get_seconds(mode) * 1000
-            
-            if current_cycle_length_ms == 0:
-                continue
-            
-            if not playing_flag:
-                    break
-                
-            mode_start_time = time.ticks_ms()
-            playtone(get_signal_tone(mode))
-            while True:
-
-                elapsed = time.ticks_diff(time.ticks_ms(), mode_start_time)
-
-                if elapsed > sound_duration_ms:
-                    bequiet()
-
-                progress = min(1.0 * elapsed / current_cycle_length_ms, 1.0)
-
-                visualize(progress, mode)
-
-                # make interruptable
-                if any_button_pressed():
-                    playing_flag = False
-                if not playing_flag:
-                    break
-                if progress >= 1.0:
-                    break
-            bequiet()
-
-        elapsed_total = time.ticks_diff(time.ticks_ms(), start_time)
-        if elapsed_total > total_duration_ms:
-            break
-    bequiet()
-
-    # final tone at end
-    final_start_time = time.ticks_ms()
-    playtone(get_signal_tone(Mode.STAY))
-    while True:
-        elapsed = time.ticks_diff(time.ticks_ms(), final_start_time)
-        if elapsed > 500:
-            break
-    bequiet()
+    session.run(settings)
+    session.report()
 
 clear_display()
 
@@ -110,16 +130,19 @@ write_menu(settings, current_selected_line)
 while True:
     #print("running")
     if button_down():
+        telemetry.emit(telemetry.EV_BUTTON, telemetry.BUTTON_DOWN)
         current_selected_line = 1 if current_selected_line == 10 else current_selected_line + 1
         change_flag = True
-        time.sleep(0.1)
+        CLOCK.sleep_ms(100)
     
     elif button_up():
+        telemetry.emit(telemetry.EV_BUTTON, telemetry.BUTTON_UP)
         current_selected_line = 10 if current_selected_line == 1 else current_selected_line - 1
         change_flag = True
-        time.sleep(0.1)
+        CLOCK.sleep_ms(100)
         
     elif button_right():
+        telemetry.emit(telemetry.EV_BUTTON, telemetry.BUTTON_RIGHT)
         
         # run program
         if current_selected_line == 10:
@@ -132,14 +155,12 @@ while True:
             
             # wait until released
             while any_button_pressed():
-                time.sleep(0.1)
-            
-            playing_flag = True
+                CLOCK.sleep_ms(100)
             
             main(settings)
             
             # at the end of the main program, clear display
-            time.sleep(0.05)
+            CLOCK.sleep_ms(50)
             clear_display()
             
         else:
@@ -178,9 +199,10 @@ while True:
                 settings.half_seconds_stay = 3*2
                 
         change_flag = True
-        time.sleep(0.05)
+        CLOCK.sleep_ms(50)
         
     elif button_left():
+        telemetry.emit(telemetry.EV_BUTTON, telemetry.BUTTON_LEFT)
         #clear_display()
         if current_selected_line == 1:
             settings.total_duration = max(1, settings.total_duration - 1)
@@ -194,12 +216,14 @@ while True:
             settings.half_seconds_stay = max(0, settings.half_seconds_stay - 1)
         
         change_flag = True
-        time.sleep(0.05)
+        CLOCK.sleep_ms(50)
         
     if change_flag:
         
         write_menu(settings, current_selected_line)
-        time.sleep(0.1)
+        CLOCK.sleep_ms(100)
         change_flag = False
+
+    telemetry.drain()
     #display.update()
     
\ No newline at end of file
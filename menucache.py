@@ -0,0 +1,63 @@
+import os
+import struct
+
+# Pre-rendered menu backgrounds stored in flash.
+# The static part of the menu (title, labels, preset names) never changes,
+# so each backend renders it once, stores the raw framebuffer here and on
+# every later redraw just reads it back into the framebuffer before
+# drawing the few dynamic fields on top. Images are raw framebuffer bytes;
+# reading them straight into the framebuffer is faster than decoding RLE
+# in bytecode and needs no extra RAM.
+#
+# file: "menu_<key>_v<LAYOUT_VERSION>.bin" = MAGIC | length u32 | pixels
+# Keys are "<display>" or "<display>_<variant>", storing an image drops the
+# other variants and layouts of the same display. Bump LAYOUT_VERSION
+# whenever the static menu layout changes.
+
+LAYOUT_VERSION = 3
+MAGIC = b"MNU1"
+HEADER = "<4sI"
+HEADER_SIZE = 8
+PREFIX = "menu_"
+
+
+def path(key):
+    return "%s%s_v%d.bin" % (PREFIX, key, LAYOUT_VERSION)
+
+
+def load(key, buffer):
+    # copy the cached image into buffer, False if there is none that fits
+    try:
+        with open(path(key), "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) != HEADER_SIZE:
+                return False
+            magic, length = struct.unpack(HEADER, header)
+            if magic != MAGIC or length != len(buffer):
+                return False
+            return f.readinto(buffer) == length
+    except OSError:
+        return False
+
+
+def store(key, buffer):
+    # write the image and drop the older images of the same display
+    name = path(key)
+    stale = PREFIX + key.split("_")[0] + "_"
+    try:
+        for entry in os.listdir():
+            if entry.startswith(stale) and entry != name:
+                os.remove(entry)
+        with open(name, "wb") as f:
+            f.write(struct.pack(HEADER, MAGIC, len(buffer)))
+            f.write(buffer)
+        return True
+    except OSError as e:
+        print("Could not store menu image", name, e)
+        return False
+
+
+def clear():
+    for entry in os.listdir():
+        if entry.startswith(PREFIX):
+            os.remove(entry)
@@ -0,0 +1,166 @@
+import sys
+import struct
+from array import array
+
+try:
+    import select
+except ImportError:
+    select = None
+
+from fastpath import checksum, row_hash, rle_encode, upscale_row
+
+# Live copy of the panel over the USB serial console, for demos and
+# debugging (host/mirror_viewer.py shows it).
+# On every flush each framebuffer row is hashed; only rows whose hash
+# changed since they were last sent go out, run-length encoded (or raw if
+# that is shorter). A frame never sends more than budget bytes and stops
+# as soon as the host is not reading, rows left over stay dirty and go
+# out with the next frames, so mirroring never holds up the frame loop.
+# POLLOUT only promises some free space in the USB FIFO, so packets are
+# written in CHUNK byte pieces with a check in front of each; a packet the
+# host stopped taking halfway ends the frame and the viewer drops it.
+# The stream is the REPL console, shared with telemetry.py: lcd.MIRROR and
+# main.SERIAL_TELEMETRY are off by default and only one should be on.
+# Like the frame loop itself it does not allocate: views and shape are
+# set up when the shape changes, writes pass the length instead of a
+# slice where the stream supports it (MicroPython streams do).
+# Every REFRESH_FRAMES frames all rows are marked dirty again so a viewer
+# that connects late catches up.
+#
+# packet (little endian):
+#   sync 0x5A | kind u8 | a u16 | b u16 | payload | checksum u8
+#   FRAME_START  a = width, b = height, payload = scale u8
+#   ROW_RLE      a = row, b = payload length, payload = (count u8, pixel) runs
+#   ROW_RAW      a = row, b = payload length, payload = RGB565 row
+#   FRAME_END    a = frame number & 0xFFFF, b = 0
+# checksum is the low byte of the sum of header and payload. Pixels are
+# sent in framebuffer byte order (RGB565, high byte first).
+
+SYNC = 0x5A
+HEADER = "<BBHH"
+HEADER_SIZE = 6
+
+FRAME_START = 1
+ROW_RLE = 2
+ROW_RAW = 3
+FRAME_END = 4
+
+BUDGET = 2 * 1024
+CHUNK = 64          # one USB full speed packet
+REFRESH_FRAMES = 300
+
+
+class Mirror:
+
+    def __init__(self, max_width, max_height, stream=None, budget=BUDGET):
+        self.budget = budget
+        self.hashes = array("i", [-1] * max_height)
+        self.packet = bytearray(HEADER_SIZE + max_width * 2 + 1)
+        self.packet_mv = memoryview(self.packet)
+        self.payload = self.packet_mv[HEADER_SIZE:HEADER_SIZE + max_width * 2]
+        self.width = self.height = self.scale = 0
+        self.row = self.payload
+        self.frames = 0
+        self.sent = 0       # bytes
+        self.skipped = 0    # frames the host was not ready for
+        if stream is None:
+            stream = getattr(sys.stdout, "buffer", sys.stdout)
+        self.stream = stream
+        try:
+            stream.write(self.packet, 0, 0)
+            self.sized_write = True
+        except TypeError:
+            self.sized_write = False
+        self.poller = None
+        if select is not None:
+            try:
+                self.poller = select.poll()
+                self.poller.register(sys.stdout, select.POLLOUT)
+            except (AttributeError, OSError, ValueError):
+                self.poller = None
+
+    def writable(self):
+        if self.poller is None:
+            return True
+        if hasattr(self.poller, "ipoll"):
+            # ipoll() reuses its result, poll() builds a list
+            for _ in self.poller.ipoll(0):
+                return True
+            return False
+        return bool(self.poller.poll(0))
+
+    def invalidate(self):
+        for i in range(len(self.hashes)):
+            self.hashes[i] = -1
+
+    def _send(self, kind, a, b, length):
+        # header and checksum around the payload already in place, False
+        # when the host did not take the whole packet
+        packet = self.packet
+        struct.pack_into(HEADER, packet, 0, SYNC, kind, a, b)
+        end = HEADER_SIZE + length
+        packet[end] = checksum(packet, 0, end)
+        size = end + 1
+        start = 0
+        while start < size:
+            if start and not self.writable():
+                return False
+            count = min(CHUNK, size - start)
+            if self.sized_write:
+                written = self.stream.write(packet, start, count)
+            else:
+                written = self.stream.write(self.packet_mv[start:start + count])
+            if written is None:
+                written = count
+            self.sent += written
+            if written != count:
+                return False
+            start += count
+        return True
+
+    def frame(self, buffer, width, height, scale=1):
+        # buffer: width x height RGB565 pixels, shown scale times larger
+        self.frames += 1
+        if not self.writable():
+            self.skipped += 1
+            return
+        if width != self.width or height != self.height or scale != self.scale:
+            self.width = width
+            self.height = height
+            self.scale = scale
+            self.row = self.payload[:width * 2]
+            self.invalidate()
+        elif self.frames % REFRESH_FRAMES == 0:
+            self.invalidate()
+
+        payload = self.payload
+        payload[0] = scale
+        if not self._send(FRAME_START, width, height, 1):
+            return
+        # rows are marked sent only after their packet went out whole, a
+        # cut frame leaves the rest dirty for the next one
+        row_payload = self.row
+        hashes = self.hashes
+        row_bytes = width * 2
+        budget = self.budget
+        for row in range(height):
+            offset = row * row_bytes
+            h = row_hash(buffer, offset, row_bytes)
+            if h == hashes[row]:
+                continue
+            length = rle_encode(buffer, offset, width, row_payload)
+            kind = ROW_RLE
+            if length < 0:
+                upscale_row(buffer, offset, row_payload, 1)
+                length = row_bytes
+                kind = ROW_RAW
+            if length + HEADER_SIZE + 1 > budget or not self.writable():
+                break
+            if not self._send(kind, row, length, length):
+                return
+            budget -= length + HEADER_SIZE + 1
+            hashes[row] = h
+        self._send(FRAME_END, self.frames & 0xFFFF, 0, 0)
+
+    def report(self):
+        print("mirror: %d frames, %d skipped, %d bytes sent" % (self.frames, self.skipped, self.sent))
@@ -0,0 +1,52 @@
+from array import array
+
+from lib import MODES, Mode, PROGRESS_MAX
+
+# Phase colour ramps, warm on inhale and cool on exhale.
+# Each backend builds its ramps once at import with its own pen encoding
+# (byte swapped RGB565 for the Waveshare framebuffers, create_pen for
+# PicoGraphics) into array lookup tables. The frame loop only indexes a
+# table with the phase progress, no colour math or create_pen per frame.
+
+STEPS = 64
+
+WARM = (255, 100, 30)
+COOL = (30, 90, 220)
+
+# colour at the start and at the end of each phase
+PHASE_COLORS = {
+    Mode.IN: (COOL, WARM),
+    Mode.HOLD: (WARM, WARM),
+    Mode.OUT: (WARM, COOL),
+    Mode.STAY: (COOL, COOL),
+}
+
+
+def rgb565(r, g, b):
+    return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
+
+
+def swap16(color):
+    # framebuf.RGB565 buffers go to the panel as they are, high byte first
+    return ((color & 0xFF) << 8) | (color >> 8)
+
+
+def lcd_pen(r, g, b):
+    return swap16(rgb565(r, g, b))
+
+
+def ramp(start, end, pen, steps=STEPS, typecode="H"):
+    table = array(typecode, [0] * steps)
+    for i in range(steps):
+        table[i] = pen(*[a + (b - a) * i // (steps - 1) for a, b in zip(start, end)])
+    return table
+
+
+def build(pen, steps=STEPS, typecode="H"):
+    # {mode: ramp} for every phase
+    return {mode: ramp(*PHASE_COLORS[mode], pen=pen, steps=steps, typecode=typecode)
+            for mode in MODES}
+
+
+def color_at(table, progress):
+    return table[progress * (len(table) - 1) // PROGRESS_MAX]
@@ -3,9 +3,12 @@
 # You'll need to connect a jumper wire between GPO and AUDIO on the Explorer Base to hear noise.
 
 import time
-from lib import BreathingSettings, Mode, get_signal_tone
+from lib import BreathingSettings, Mode, PROGRESS_MAX, get_signal_tone
+import menucache
+import palette
+import heapplan
 
-from picographics import PicoGraphics, DISPLAY_PICO_EXPLORER
+from picographics import PicoGraphics, DISPLAY_PICO_EXPLORER, PEN_RGB332
 from pimoroni import Button, Analog, Buzzer
 
 from machine import Pin, PWM, Timer
@@ -14,7 +17,15 @@ import math
 import json
 import os
 
-display = PicoGraphics(display=DISPLAY_PICO_EXPLORER)
+try:
+    from picographics import get_buffer_size
+    # framebuffer from the boot heap plan, see heapplan.py
+    display = PicoGraphics(display=DISPLAY_PICO_EXPLORER, pen_type=PEN_RGB332,
+                           buffer=heapplan.reserve(heapplan.FRAMEBUFFER, "explorer",
+                                                   get_buffer_size(DISPLAY_PICO_EXPLORER, PEN_RGB332)))
+except ImportError:
+    # firmware without get_buffer_size, PicoGraphics allocates it
+    display = PicoGraphics(display=DISPLAY_PICO_EXPLORER, pen_type=PEN_RGB332)
 
 BLACK = display.create_pen(0, 0, 0) # black back light
 BASE_COLOR = display.create_pen(255, 100, 30)  # Use warm nightlight color
@@ -24,6 +35,9 @@ BUTTON_DOWN = Button(13)
 BUTTON_PLUS = Button(14)
 BUTTON_MINUS = Button(15)
 
+# pins that wake the session from idle
+BUTTON_PINS = (Pin(12), Pin(13), Pin(14), Pin(15))
+
 def button_up():
     return BUTTON_UP.is_pressed
 def button_down():
@@ -53,38 +67,57 @@ CX = WIDTH // 2
 CY = HEIGHT // 2
 MAX_RADIUS = min(WIDTH, HEIGHT) // 2
 
-def draw_circle(radius):
+def draw_circle(radius, pen=BASE_COLOR):
     display.set_pen(BLACK)
     display.clear()
     
-    display.set_pen(BASE_COLOR)
+    display.set_pen(pen)
     display.circle(CX, CY, radius)
-    display.update()
 
-def visualize(progress, mode):
+# phases whose picture does not depend on progress
+STATIC_MODES = (Mode.HOLD, Mode.STAY)
+
+# phase colour per progress step as pens, see palette.py
+RAMPS = palette.build(display.create_pen, typecode="I")
+
+def render(progress, mode):
 
     min_radius = 5
     if mode == Mode.IN:
-        radius = max(min_radius, int(progress * MAX_RADIUS))
+        radius = max(min_radius, progress * MAX_RADIUS // PROGRESS_MAX)
     elif mode == Mode.HOLD:
         radius = MAX_RADIUS
     elif mode == Mode.OUT:
-        radius = max(min_radius, int((1.0 - progress) * MAX_RADIUS))
+        radius = max(min_radius, (PROGRESS_MAX - progress) * MAX_RADIUS // PROGRESS_MAX)
     elif mode == Mode.STAY:
         radius = min_radius
     else:
         raise Exception("Unknown mode")
 
-    draw_circle(radius)
+    draw_circle(radius, palette.color_at(RAMPS[mode], progress))
+
+def flush():
+    display.update()
+
+def visualize(progress, mode):
+    render(progress, mode)
+    flush()
+
 
+def draw_underline(text, x, y, scale=4):
+    text_width = display.measure_text(text, scale=scale)
+    text_height = int(8 * scale)  # bitmap8 is ~8px tall
+    display.line(x, y + text_height, x + text_width, y + text_height)
 
 def draw_text(text, x, y, scale=4, underline=False, clearing=False):
     text_width = display.measure_text(text, scale=scale)
     text_height = int(8 * scale)  # bitmap8 is ~8px tall
 
     # if clearing:
+    # clear only the box of this text and its underline, the static menu
+    # around it comes from the cached background
     display.set_pen(BLACK)
-    display.rectangle(x, y, text_width + display.measure_text(" ", scale=scale), y + text_height)  # height of underline
+    display.rectangle(x, y, text_width + display.measure_text(" ", scale=scale), text_height + 1)
 
     display.set_pen(BASE_COLOR)
 
@@ -94,34 +127,70 @@ def draw_text(text, x, y, scale=4, underline=False, clearing=False):
         # underline position (y + font height)
         display.line(x, y + text_height, x + text_width, y + text_height)
 
+SCALE_TITLE = 3.5
+SCALE_TEXT = 2
+SCALE_NUMBERS = 3
+Y_DURATION = 105
+Y_PRESETS = 165
+
+# static part of the menu, (text, x, y, scale); cached in flash by menucache
+MENU_LABELS = (
+    ("Pico Atemcoach ", 0, 0, SCALE_TITLE),
+    ("------------------- ", 0, 20, SCALE_TITLE),
+    ("Laufzeit [min]:", 0, 50, SCALE_TEXT),
+    ("Dauer [sec]:", 0, 80, SCALE_TEXT),
+    (" in", 5, Y_DURATION, SCALE_TEXT),
+    ("hold", 65, Y_DURATION, SCALE_TEXT),
+    (" out", 125, Y_DURATION, SCALE_TEXT),
+    ("keep", 185, Y_DURATION, SCALE_TEXT),
+    ("Presets:", 0, 140, SCALE_TEXT),
+    ("4-7-8", 0, Y_PRESETS, SCALE_TEXT),
+    ("box", 70, Y_PRESETS, SCALE_TEXT),
+    ("gold", 120, Y_PRESETS, SCALE_TEXT),
+    ("nat", 190, Y_PRESETS, SCALE_TEXT),
+    ("START BREATHING", 10, 200, SCALE_TEXT),
+)
+
+# static labels that get underlined when selected, menu entries 6..10
+MENU_UNDERLINED_LABELS = {6: MENU_LABELS[9], 7: MENU_LABELS[10], 8: MENU_LABELS[11],
+                          9: MENU_LABELS[12], 10: MENU_LABELS[13]}
+
+MENU_CACHE_KEY = "explorer"
+
+# keep the static menu in flash (menucache.py). Off: PicoGraphics clear()
+# and text() draw it in C faster than LittleFS reads the 57.6 KB image back;
+# time both on the board with benchmark.py before turning it on
+MENU_CACHE = False
+
+try:
+    # PicoGraphics exposes its framebuffer through the buffer protocol
+    FRAMEBUFFER = memoryview(display)
+except TypeError:
+    FRAMEBUFFER = None
+
+def draw_menu_background():
+    cache = MENU_CACHE and FRAMEBUFFER is not None
+    if cache and menucache.load(MENU_CACHE_KEY, FRAMEBUFFER):
+        return
+    display.set_pen(BLACK)
+    display.clear()
+    for text, x, y, scale in MENU_LABELS:
+        draw_text(text, x, y, scale=scale)
+    if cache:
+        menucache.store(MENU_CACHE_KEY, FRAMEBUFFER)
+
 def write_menu(settings, current_selected_line):
-    display.set_pen(BASE_COLOR)
-    scale_title = 3.5
-    scale_text = 2
-    scale_numbers = 3
-
-    draw_text("Pico Atemcoach ", 0, 0, scale=scale_title)
-    draw_text("------------------- ", 0, 20, scale=scale_title)
-    draw_text("Laufzeit [min]:", 0, 50, scale=scale_text)
-    draw_text("%s" % settings.total_duration, 160, 45, scale=scale_numbers, underline=current_selected_line == 1)
-    
-    draw_text("Dauer [sec]:", 0, 80, scale=scale_text)
-    y_duration = 105
-    draw_text(" in", 5, y_duration, scale=scale_text)
-    draw_text("%s" % (0.5 * settings.half_seconds_in), 5, y_duration, scale=scale_numbers, underline=current_selected_line == 2)
-    draw_text("hold", 65, y_duration, scale=scale_text)
-    draw_text("%s" % (0.5 * settings.half_seconds_hold), 65, y_duration, scale=scale_numbers, underline=current_selected_line == 3)
-    draw_text(" out", 125, y_duration, scale=scale_text)
-    draw_text("%s" % (0.5 * settings.half_seconds_out), 125, y_duration, scale=scale_numbers, underline=current_selected_line == 4)
-    draw_text("keep", 185, y_duration, scale=scale_text)
-    draw_text("%s" % (0.5 * settings.half_seconds_stay), 185, y_duration, scale=scale_numbers, underline=current_selected_line == 5)
-    
-    draw_text("Presets:", 0, 140, scale=scale_text)
-    y_presets = 165
-    draw_text("4-7-8", 0, y_presets, scale=scale_text, underline=current_selected_line == 6)
-    draw_text("box", 70, y_presets, scale=scale_text, underline=current_selected_line == 7)
-    draw_text("gold", 120, y_presets, scale=scale_text, underline=current_selected_line == 8)
-    draw_text("nat", 190, y_presets, scale=scale_text, underline=current_selected_line == 9)
-
-    draw_text("START BREATHING", 10, 200, scale=scale_text, underline=current_selected_line == 10)
+    draw_menu_background()
+
+    draw_text("%s" % settings.total_duration, 160, 45, scale=SCALE_NUMBERS, underline=current_selected_line == 1)
+    draw_text("%s" % (0.5 * settings.half_seconds_in), 5, Y_DURATION, scale=SCALE_NUMBERS, underline=current_selected_line == 2)
+    draw_text("%s" % (0.5 * settings.half_seconds_hold), 65, Y_DURATION, scale=SCALE_NUMBERS, underline=current_selected_line == 3)
+    draw_text("%s" % (0.5 * settings.half_seconds_out), 125, Y_DURATION, scale=SCALE_NUMBERS, underline=current_selected_line == 4)
+    draw_text("%s" % (0.5 * settings.half_seconds_stay), 185, Y_DURATION, scale=SCALE_NUMBERS, underline=current_selected_line == 5)
+
+    if current_selected_line in MENU_UNDERLINED_LABELS:
+        text, x, y, scale = MENU_UNDERLINED_LABELS[current_selected_line]
+        display.set_pen(BASE_COLOR)
+        draw_underline(text, x, y, scale=scale)
+
     display.update()
@@ -1,187 +1,46 @@
-from machine import Pin,SPI,PWM
-import framebuf
+from machine import Pin
 import time
 
+from st77xx import ST77xx
+
 #color is BGR
 RED = 0x00F8
 GREEN = 0xE007
 BLUE = 0x1F00
 WHITE = 0xFFFF
 BLACK = 0x0000
-class LCD_0inch96(framebuf.FrameBuffer):
-    def __init__(self):
-    
-        self.width = 160
-        self.height = 80
-        
-        self.cs = Pin(9,Pin.OUT)
-        self.rst = Pin(12,Pin.OUT)
-#        self.bl = Pin(13,Pin.OUT)
-        self.cs(1)
-        # pwm = PWM(Pin(13))#BL
-        # pwm.freq(1000)        
-        self.spi = SPI(1)
-        self.spi = SPI(1,1000_000)
-        self.spi = SPI(1,10000_000,polarity=0, phase=0,sck=Pin(10),mosi=Pin(11),miso=None)
-        self.dc = Pin(8,Pin.OUT)
-        self.dc(1)
-        self.buffer = bytearray(self.height * self.width * 2)
-        super().__init__(self.buffer, self.width, self.height, framebuf.RGB565)
-        self.Init()
-        self.SetWindows(0, 0, self.width-1, self.height-1)
-        
-    def reset(self):
-        self.rst(1)
-        time.sleep(0.2) 
-        self.rst(0)
-        time.sleep(0.2)         
-        self.rst(1)
-        time.sleep(0.2) 
-        
-    def write_cmd(self, cmd):
-        self.dc(0)
-        self.cs(0)
-        self.spi.write(bytearray([cmd]))
-
-    def write_data(self, buf):
-        self.dc(1)
-        self.cs(0)
-        self.spi.write(bytearray([buf]))
-        self.cs(1)
-
-    def backlight(self,value):#value:  min:0  max:1000
-        pwm = PWM(Pin(13))#BL
-        pwm.freq(1000)
-        if value>=1000:
-            value=1000
-        data=int (value*65536/1000)       
-        pwm.duty_u16(data)  
-        
-    def Init(self):
-        self.reset() 
-        self.backlight(10000)  
-        
-        self.write_cmd(0x11)
-        time.sleep(0.12)
-        self.write_cmd(0x21) 
-        self.write_cmd(0x21) 
-
-        self.write_cmd(0xB1) 
-        self.write_data(0x05)
-        self.write_data(0x3A)
-        self.write_data(0x3A)
-
-        self.write_cmd(0xB2)
-        self.write_data(0x05)
-        self.write_data(0x3A)
-        self.write_data(0x3A)
-
-        self.write_cmd(0xB3) 
-        self.write_data(0x05)  
-        self.write_data(0x3A)
-        self.write_data(0x3A)
-        self.write_data(0x05)
-        self.write_data(0x3A)
-        self.write_data(0x3A)
-
-        self.write_cmd(0xB4)
-        self.write_data(0x03)
-
-        self.write_cmd(0xC0)
-        self.write_data(0x62)
-        self.write_data(0x02)
-        self.write_data(0x04)
-
-        self.write_cmd(0xC1)
-        self.write_data(0xC0)
+class LCD_0inch96(ST77xx):
+
+    WIDTH = 160
+    HEIGHT = 80
+    X_OFFSET = 1
+    Y_OFFSET = 26
+
+    RESET_DELAY_MS = 200
+    BACKLIGHT = 1000
+
+    INIT = (
+        (0x11, b"", 120),
+        (0x21, b"", 0),
+        (0x21, b"", 0),
+        (0xB1, b"\x05\x3A\x3A", 0),
+        (0xB2, b"\x05\x3A\x3A", 0),
+        (0xB3, b"\x05\x3A\x3A\x05\x3A\x3A", 0),
+        (0xB4, b"\x03", 0),
+        (0xC0, b"\x62\x02\x04", 0),
+        (0xC1, b"\xC0", 0),
+        (0xC2, b"\x0D\x00", 0),
+        (0xC3, b"\x8D\x6A", 0),
+        (0xC4, b"\x8D\xEE", 0),
+        (0xC5, b"\x0E", 0),
+        (0xE0, b"\x10\x0E\x02\x03\x0E\x07\x02\x07\x0A\x12\x27\x37\x00\x0D\x0E\x10", 0),
+        (0xE1, b"\x10\x0E\x03\x03\x0F\x06\x02\x08\x0A\x13\x26\x36\x00\x0D\x0E\x10", 0),
+        (0x3A, b"\x05", 0),
+        (0x36, b"\xA8", 0),
+        (0x29, b"", 0),
+    )
 
-        self.write_cmd(0xC2)
-        self.write_data(0x0D)
-        self.write_data(0x00)
 
-        self.write_cmd(0xC3)
-        self.write_data(0x8D)
-        self.write_data(0x6A)   
-
-        self.write_cmd(0xC4)
-        self.write_data(0x8D) 
-        self.write_data(0xEE) 
-
-        self.write_cmd(0xC5)
-        self.write_data(0x0E)    
-
-        self.write_cmd(0xE0)
-        self.write_data(0x10)
-        self.write_data(0x0E)
-        self.write_data(0x02)
-        self.write_data(0x03)
-        self.write_data(0x0E)
-        self.write_data(0x07)
-        self.write_data(0x02)
-        self.write_data(0x07)
-        self.write_data(0x0A)
-        self.write_data(0x12)
-        self.write_data(0x27)
-        self.write_data(0x37)
-        self.write_data(0x00)
-        self.write_data(0x0D)
-        self.write_data(0x0E)
-        self.write_data(0x10)
-
-        self.write_cmd(0xE1)
-        self.write_data(0x10)
-        self.write_data(0x0E)
-        self.write_data(0x03)
-        self.write_data(0x03)
-        self.write_data(0x0F)
-        self.write_data(0x06)
-        self.write_data(0x02)
-        self.write_data(0x08)
-        self.write_data(0x0A)
-        self.write_data(0x13)
-        self.write_data(0x26)
-        self.write_data(0x36)
-        self.write_data(0x00)
-        self.write_data(0x0D)
-        self.write_data(0x0E)
-        self.write_data(0x10)
-
-        self.write_cmd(0x3A) 
-        self.write_data(0x05)
-
-        self.write_cmd(0x36)
-        self.write_data(0xA8)
-
-        self.write_cmd(0x29) 
-        
-    def SetWindows(self, Xstart, Ystart, Xend, Yend):#example max:0,0,159,79
-        Xstart=Xstart+1
-        Xend=Xend+1
-        Ystart=Ystart+26
-        Yend=Yend+26
-        self.write_cmd(0x2A)
-        self.write_data(0x00)              
-        self.write_data(Xstart)      
-        self.write_data(0x00)              
-        self.write_data(Xend) 
-
-        self.write_cmd(0x2B)
-        self.write_data(0x00)
-        self.write_data(Ystart)
-        self.write_data(0x00)
-        self.write_data(Yend)
-
-        self.write_cmd(0x2C) 
-        
-    def display(self):
-    
-        self.SetWindows(0,0,self.width-1,self.height-1)       
-        self.dc(1)
-        self.cs(0)
-        self.spi.write(self.buffer)
-        self.cs(1)        
-            
-    
 if __name__=='__main__':
 
     lcd = LCD_0inch96()   
@@ -189,7 +48,7 @@ if __name__=='__main__':
     lcd.text("Hello pico!",35,15,GREEN)
     lcd.text("This is:",50,35,GREEN)    
     lcd.text("Pico-LCD-0.96",30,55,GREEN)
-    lcd.display()
+    lcd.show()
     
     lcd.hline(10,10,140,BLUE)
     lcd.hline(10,70,140,BLUE)
@@ -201,7 +60,7 @@ if __name__=='__main__':
     lcd.vline(0,0,80,BLUE)
     lcd.vline(159,0,80,BLUE) 
     
-    lcd.display()
+    lcd.show()
     time.sleep(3)     
     #game GUI
 ###    
@@ -215,7 +74,7 @@ if __name__=='__main__':
     while(i<=160):
         lcd.vline(i,0,80,BLACK)
         i=i+10 
-    lcd.display()
+    lcd.show()
 ###    
     
     x=80
@@ -294,7 +153,7 @@ if __name__=='__main__':
             
 
                 
-        lcd.display()   
+        lcd.show()   
     
     time.sleep(1)
     
@@ -1,175 +1,61 @@
-from machine import Pin,SPI,PWM
-import framebuf
+from machine import Pin,PWM
 import time
 
-BL = 13
-DC = 8
-RST = 12
-MOSI = 11
-SCK = 10
-CS = 9
+from st77xx import ST77xx, BL
+
+#color BRG
+RED = 0x07E0
+GREEN = 0x001f
+BLUE = 0xf800
+WHITE = 0xffff
+
+
+class LCD_1inch14(ST77xx):
+
+    WIDTH = 240
+    HEIGHT = 135
+    X_OFFSET = 40
+    Y_OFFSET = 53
+
+    INIT = (
+        (0x36, b"\x70", 0),
+        (0x3A, b"\x05", 0),
+        (0xB2, b"\x0C\x0C\x00\x33\x33", 0),
+        (0xB7, b"\x35", 0),
+        (0xBB, b"\x19", 0),
+        (0xC0, b"\x2C", 0),
+        (0xC2, b"\x01", 0),
+        (0xC3, b"\x12", 0),
+        (0xC4, b"\x20", 0),
+        (0xC6, b"\x0F", 0),
+        (0xD0, b"\xA4\xA1", 0),
+        (0xE0, b"\xD0\x04\x0D\x11\x13\x2B\x3F\x54\x4C\x18\x0D\x0B\x1F\x23", 0),
+        (0xE1, b"\xD0\x04\x0C\x11\x13\x2C\x3F\x44\x51\x2F\x1F\x1F\x20\x23", 0),
+        (0x21, b"", 0),
+        (0x11, b"", 0),
+        (0x29, b"", 0),
+    )
 
 
-class LCD_1inch14(framebuf.FrameBuffer):
-    def __init__(self):
-        self.width = 240
-        self.height = 135
-        
-        self.cs = Pin(CS,Pin.OUT)
-        self.rst = Pin(RST,Pin.OUT)
-        
-        self.cs(1)
-        self.spi = SPI(1)
-        self.spi = SPI(1,1000_000)
-        self.spi = SPI(1,10000_000,polarity=0, phase=0,sck=Pin(SCK),mosi=Pin(MOSI),miso=None)
-        self.dc = Pin(DC,Pin.OUT)
-        self.dc(1)
-        self.buffer = bytearray(self.height * self.width * 2)
-        super().__init__(self.buffer, self.width, self.height, framebuf.RGB565)
-        self.init_display()
-        
-        self.red   =   0x07E0
-        self.green =   0x001f
-        self.blue  =   0xf800
-        self.white =   0xffff
-        
-    def write_cmd(self, cmd):
-        self.cs(1)
-        self.dc(0)
-        self.cs(0)
-        self.spi.write(bytearray([cmd]))
-        self.cs(1)
-
-    def write_data(self, buf):
-        self.cs(1)
-        self.dc(1)
-        self.cs(0)
-        self.spi.write(bytearray([buf]))
-        self.cs(1)
-
-    def init_display(self):
-        """Initialize dispaly"""  
-        self.rst(1)
-        self.rst(0)
-        self.rst(1)
-        
-        self.write_cmd(0x36)
-        self.write_data(0x70)
-
-        self.write_cmd(0x3A) 
-        self.write_data(0x05)
-
-        self.write_cmd(0xB2)
-        self.write_data(0x0C)
-        self.write_data(0x0C)
-        self.write_data(0x00)
-        self.write_data(0x33)
-        self.write_data(0x33)
-
-        self.write_cmd(0xB7)
-        self.write_data(0x35) 
-
-        self.write_cmd(0xBB)
-        self.write_data(0x19)
-
-        self.write_cmd(0xC0)
-        self.write_data(0x2C)
-
-        self.write_cmd(0xC2)
-        self.write_data(0x01)
-
-        self.write_cmd(0xC3)
-        self.write_data(0x12)   
-
-        self.write_cmd(0xC4)
-        self.write_data(0x20)
-
-        self.write_cmd(0xC6)
-        self.write_data(0x0F) 
-
-        self.write_cmd(0xD0)
-        self.write_data(0xA4)
-        self.write_data(0xA1)
-
-        self.write_cmd(0xE0)
-        self.write_data(0xD0)
-        self.write_data(0x04)
-        self.write_data(0x0D)
-        self.write_data(0x11)
-        self.write_data(0x13)
-        self.write_data(0x2B)
-        self.write_data(0x3F)
-        self.write_data(0x54)
-        self.write_data(0x4C)
-        self.write_data(0x18)
-        self.write_data(0x0D)
-        self.write_data(0x0B)
-        self.write_data(0x1F)
-        self.write_data(0x23)
-
-        self.write_cmd(0xE1)
-        self.write_data(0xD0)
-        self.write_data(0x04)
-        self.write_data(0x0C)
-        self.write_data(0x11)
-        self.write_data(0x13)
-        self.write_data(0x2C)
-        self.write_data(0x3F)
-        self.write_data(0x44)
-        self.write_data(0x51)
-        self.write_data(0x2F)
-        self.write_data(0x1F)
-        self.write_data(0x1F)
-        self.write_data(0x20)
-        self.write_data(0x23)
-        
-        self.write_cmd(0x21)
-
-        self.write_cmd(0x11)
-
-        self.write_cmd(0x29)
-
-    def show(self):
-        self.write_cmd(0x2A)
-        self.write_data(0x00)
-        self.write_data(0x28)
-        self.write_data(0x01)
-        self.write_data(0x17)
-        
-        self.write_cmd(0x2B)
-        self.write_data(0x00)
-        self.write_data(0x35)
-        self.write_data(0x00)
-        self.write_data(0xBB)
-        
-        self.write_cmd(0x2C)
-        
-        self.cs(1)
-        self.dc(1)
-        self.cs(0)
-        self.spi.write(self.buffer)
-        self.cs(1)
-  
 if __name__=='__main__':
     pwm = PWM(Pin(BL))
     pwm.freq(1000)
     pwm.duty_u16(32768)#max 65535
 
     LCD = LCD_1inch14()
-    #color BRG
-    LCD.fill(LCD.white)
+    LCD.fill(WHITE)
  
     LCD.show()
-    LCD.text("Raspberry Pi Pico",90,40,LCD.red)
-    LCD.text("PicoGo",90,60,LCD.green)
-    LCD.text("Pico-LCD-1.14",90,80,LCD.blue)
+    LCD.text("Raspberry Pi Pico",90,40,RED)
+    LCD.text("PicoGo",90,60,GREEN)
+    LCD.text("Pico-LCD-1.14",90,80,BLUE)
     
     
     
-    LCD.hline(10,10,220,LCD.blue)
-    LCD.hline(10,125,220,LCD.blue)
-    LCD.vline(10,10,115,LCD.blue)
-    LCD.vline(230,10,115,LCD.blue)
+    LCD.hline(10,10,220,BLUE)
+    LCD.hline(10,125,220,BLUE)
+    LCD.vline(10,10,115,BLUE)
+    LCD.vline(230,10,115,BLUE)
 
     
     LCD.show()
@@ -184,62 +70,62 @@ if __name__=='__main__':
     
     while(1):
         if(keyA.value() == 0):
-            LCD.fill_rect(208,12,20,20,LCD.red)
+            LCD.fill_rect(208,12,20,20,RED)
             print("A")
         else :
-            LCD.fill_rect(208,12,20,20,LCD.white)
-            LCD.rect(208,12,20,20,LCD.red)
+            LCD.fill_rect(208,12,20,20,WHITE)
+            LCD.rect(208,12,20,20,RED)
             
             
         if(keyB.value() == 0):
-            LCD.fill_rect(208,103,20,20,LCD.red)
+            LCD.fill_rect(208,103,20,20,RED)
             print("B")
         else :
-            LCD.fill_rect(208,103,20,20,LCD.white)
-            LCD.rect(208,103,20,20,LCD.red)
+            LCD.fill_rect(208,103,20,20,WHITE)
+            LCD.rect(208,103,20,20,RED)
     
     
     
     
         if(key2.value() == 0):#上
-            LCD.fill_rect(37,35,20,20,LCD.red)
+            LCD.fill_rect(37,35,20,20,RED)
             print("UP")
         else :
-            LCD.fill_rect(37,35,20,20,LCD.white)
-            LCD.rect(37,35,20,20,LCD.red)
+            LCD.fill_rect(37,35,20,20,WHITE)
+            LCD.rect(37,35,20,20,RED)
             
             
         if(key3.value() == 0):#中
-            LCD.fill_rect(37,60,20,20,LCD.red)
+            LCD.fill_rect(37,60,20,20,RED)
             print("CTRL")
         else :
-            LCD.fill_rect(37,60,20,20,LCD.white)
-            LCD.rect(37,60,20,20,LCD.red)
+            LCD.fill_rect(37,60,20,20,WHITE)
+            LCD.rect(37,60,20,20,RED)
             
         
 
         if(key4.value() == 0):#左
-            LCD.fill_rect(12,60,20,20,LCD.red)
+            LCD.fill_rect(12,60,20,20,RED)
             print("LEFT")
         else :
-            LCD.fill_rect(12,60,20,20,LCD.white)
-            LCD.rect(12,60,20,20,LCD.red)
+            LCD.fill_rect(12,60,20,20,WHITE)
+            LCD.rect(12,60,20,20,RED)
             
             
         if(key5.value() == 0):#下
-            LCD.fill_rect(37,85,20,20,LCD.red)
+            LCD.fill_rect(37,85,20,20,RED)
             print("DOWN")
         else :
-            LCD.fill_rect(37,85,20,20,LCD.white)
-            LCD.rect(37,85,20,20,LCD.red)
+            LCD.fill_rect(37,85,20,20,WHITE)
+            LCD.rect(37,85,20,20,RED)
             
             
         if(key6.value() == 0):#右
-            LCD.fill_rect(62,60,20,20,LCD.red)
+            LCD.fill_rect(62,60,20,20,RED)
             print("RIGHT")
         else :
-            LCD.fill_rect(62,60,20,20,LCD.white)
-            LCD.rect(62,60,20,20,LCD.red)
+            LCD.fill_rect(62,60,20,20,WHITE)
+            LCD.rect(62,60,20,20,RED)
 
             
         LCD.show()
@@ -0,0 +1,105 @@
+from array import array
+
+try:
+    import machine
+except ImportError:
+    machine = None
+
+from clock import CLOCK
+
+# Idle handling for phases whose picture does not change.
+# The session loop hands over the time until the next deadline (phase
+# boundary or end of the signal tone) and idle_until() waits it out in short
+# slices, so the CPU is halted instead of repainting the same frame. Button
+# interrupts cut the wait short. USE_LIGHTSLEEP switches from the default
+# clock.sleep_ms() (WFE halt, USB stays alive) to machine.lightsleep(), which
+# saves more but may drop the USB console while sleeping.
+
+USE_LIGHTSLEEP = False
+IDLE_SLICE_MS = 20      # upper bound for the button response time
+
+_woken = False
+
+
+def _wake(pin):
+    global _woken
+    _woken = True
+
+
+def arm_wake(pins):
+    # any button edge ends the current idle period
+    for pin in pins:
+        pin.irq(trigger=machine.Pin.IRQ_FALLING, handler=_wake)
+
+
+def disarm_wake(pins):
+    for pin in pins:
+        pin.irq(handler=None)
+
+
+def idle_until(deadline, wake=None, clock=CLOCK):
+    # wait until ticks_ms() reaches deadline, a button interrupt fires or
+    # wake() returns true; returns the time spent idle in ms
+    global _woken
+    _woken = False
+    start = clock.ticks_ms()
+    while True:
+        remaining = clock.ticks_diff(deadline, clock.ticks_ms())
+        if remaining <= 0 or _woken:
+            break
+        if wake is not None and wake():
+            break
+        if remaining > IDLE_SLICE_MS:
+            remaining = IDLE_SLICE_MS
+        if USE_LIGHTSLEEP and machine is not None:
+            machine.lightsleep(remaining)
+        else:
+            clock.sleep_ms(remaining)
+    # the tick counter keeps running while halted, callers just re-read it
+    return clock.ticks_diff(clock.ticks_ms(), start)
+
+
+def _permille(part, total):
+    if total <= 0:
+        return 0
+    return max(0, part) * 1000 // total
+
+
+class DutyMeter:
+    # CPU duty cycle per mode (all phases of the session) and of the phase
+    # that ended last: time spent outside idle_until()
+
+    def __init__(self, phases):
+        self.phases = phases
+        self.total_ms = array("i", [0] * len(phases))
+        self.idle_ms = array("i", [0] * len(phases))
+        self.phase_idle_ms = 0
+        self.last_duty = 0
+
+    def reset(self):
+        for i in range(len(self.phases)):
+            self.total_ms[i] = 0
+            self.idle_ms[i] = 0
+        self.phase_idle_ms = 0
+        self.last_duty = 0
+
+    def idle(self, phase, ms):
+        self.idle_ms[phase] += ms
+        self.phase_idle_ms += ms
+
+    def phase_done(self, phase, ms):
+        self.total_ms[phase] += ms
+        self.last_duty = _permille(ms - self.phase_idle_ms, ms)
+        self.phase_idle_ms = 0
+
+    def duty(self, phase):
+        # busy share of all phases of this mode so far, in permille
+        total = self.total_ms[phase]
+        return _permille(total - self.idle_ms[phase], total)
+
+    def report(self):
+        for i in range(len(self.phases)):
+            if self.total_ms[i]:
+                duty = self.duty(i)
+                print("duty %-4s %3d.%d%% of %d ms"
+                      % (self.phases[i], duty // 10, duty % 10, self.total_ms[i]))
@@ -0,0 +1,111 @@
+from array import array
+
+from clock import CLOCK
+
+# Per-frame stage timing for the session loop.
+# Every stage duration goes into a fixed-bucket histogram held in
+# preallocated arrays, so recording is a handful of integer operations and
+# can stay enabled on the device. Call report() at the end of a session or
+# from the REPL (after Ctrl-C) to print min/mean/p95/max per stage.
+
+STAGE_INPUT = 0
+STAGE_PROGRESS = 1
+STAGE_RENDER = 2
+STAGE_FLUSH = 3
+
+# (name, bucket width in us) per stage; the last bucket of each histogram
+# collects everything beyond BUCKETS * width
+STAGES = (
+    ("input", 10),
+    ("progress", 10),
+    ("render", 250),
+    ("flush", 1000),
+)
+BUCKETS = 64
+
+
+class FrameProfiler:
+
+    def __init__(self, stages=STAGES, buckets=BUCKETS, clock=None):
+        n = len(stages)
+        self.clock = clock or CLOCK
+        self.stages = stages
+        self.buckets = buckets
+        self.widths = array("i", [width for _, width in stages])
+        self.hist = array("i", [0] * (n * buckets))
+        self.count = array("i", [0] * n)
+        self.min_us = array("i", [0] * n)
+        self.max_us = array("i", [0] * n)
+        # sums are kept as ms plus a us remainder so they stay small ints
+        self.sum_ms = array("i", [0] * n)
+        self.rem_us = array("i", [0] * n)
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.hist)):
+            self.hist[i] = 0
+        for i in range(len(self.stages)):
+            self.count[i] = 0
+            self.min_us[i] = 0
+            self.max_us[i] = 0
+            self.sum_ms[i] = 0
+            self.rem_us[i] = 0
+
+    def record(self, stage, us):
+        if self.count[stage] == 0 or us < self.min_us[stage]:
+            self.min_us[stage] = us
+        if us > self.max_us[stage]:
+            self.max_us[stage] = us
+        self.count[stage] += 1
+        rem = self.rem_us[stage] + us
+        if rem >= 1000:
+            self.sum_ms[stage] += rem // 1000
+            rem %= 1000
+        self.rem_us[stage] = rem
+        bucket = us // self.widths[stage]
+        if bucket >= self.buckets:
+            bucket = self.buckets - 1
+        self.hist[stage * self.buckets + bucket] += 1
+
+    def mark(self, stage, start_us):
+        # record the time since start_us and return now as the next start
+        now = self.clock.ticks_us()
+        self.record(stage, self.clock.ticks_diff(now, start_us))
+        return now
+
+    def mean(self, stage):
+        count = self.count[stage]
+        if not count:
+            return 0
+        return (self.sum_ms[stage] * 1000 + self.rem_us[stage]) // count
+
+    def percentile(self, stage, percent):
+        # upper edge of the bucket holding the percentile, capped at max
+        count = self.count[stage]
+        if not count:
+            return 0
+        needed = (count * percent + 99) // 100
+        offset = stage * self.buckets
+        seen = 0
+        for bucket in range(self.buckets):
+            seen += self.hist[offset + bucket]
+            if seen >= needed:
+                return min((bucket + 1) * self.widths[stage], self.max_us[stage])
+        return self.max_us[stage]
+
+    def summary(self):
+        return [(name, self.count[i], self.min_us[i], self.mean(i),
+                 self.percentile(i, 95), self.max_us[i])
+                for i, (name, _) in enumerate(self.stages)]
+
+    def report(self):
+        print("stage      frames    min   mean    p95    max [us]")
+        for name, count, low, mean, p95, high in self.summary():
+            print("%-8s %8d %6d %6d %6d %6d" % (name, count, low, mean, p95, high))
+
+
+PROFILER = FrameProfiler()
+
+
+def report():
+    PROFILER.report()
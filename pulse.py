@@ -0,0 +1,244 @@
+from array import array
+
+import telemetry
+
+# PPG pulse sensor processing and heart rate variability paced breathing.
+# Samples come from an adcring.AdcRing (or a RecordedSource on the host).
+# BeatDetector runs a streaming integer filter chain per sample:
+#   12 bit input -> DC removal (one pole high pass, ~0.5 Hz at 100 Hz)
+#   -> one pole low pass (~4 Hz) -> adaptive threshold with hysteresis
+#   and a refractory period -> inter-beat intervals (IBI) in ms.
+# ResonancePacer looks at the heart rate swing within each breathing cycle
+# (respiratory sinus arrhythmia, max IBI - min IBI) and walks the cycle
+# length towards the period where that swing is largest, the user's
+# resonant breathing rate. It only moves the IN and OUT durations of the
+# running session, the saved settings are never changed.
+
+RATE_HZ = 100
+
+DC_SHIFT = 5        # high pass time constant 2**5 samples
+LP_SHIFT = 2        # low pass time constant 2**2 samples
+ENV_SHIFT = 7       # peak envelope decay per sample: env / 2**7
+MIN_ENVELOPE = 4 << 8   # below this there is no finger on the sensor
+IBI_MIN_MS = 300    # 200 bpm
+IBI_MAX_MS = 2000   # 30 bpm
+
+
+class BeatDetector:
+
+    def __init__(self, rate_hz=RATE_HZ, capacity=64):
+        self.rate_hz = rate_hz
+        self.refractory = rate_hz * IBI_MIN_MS // 1000
+        self.capacity = capacity
+        self.ibis = array("H", [0] * capacity)
+        self.reset()
+
+    def reset(self):
+        self.dc = -1
+        self.lowpass = 0
+        self.envelope = 0
+        self.above = False
+        self.samples = 0
+        self.last_beat = -1
+        self.beats = 0      # number of IBIs stored, ibis is a ring
+
+    def feed(self, raw):
+        # process one 16 bit sample, returns the IBI in ms on a beat, else 0
+        x = (raw >> 4) << 8                 # 12 bit, Q8
+        if self.dc < 0:
+            self.dc = x
+        self.dc += (x - self.dc) >> DC_SHIFT
+        self.lowpass += (x - self.dc - self.lowpass) >> LP_SHIFT
+        value = self.lowpass
+
+        envelope = self.envelope
+        envelope -= envelope >> ENV_SHIFT
+        if value > envelope:
+            envelope = value
+        self.envelope = envelope
+
+        n = self.samples + 1
+        self.samples = n
+        if self.above:
+            if value < envelope >> 2:
+                self.above = False
+            return 0
+        if value <= envelope >> 1 or envelope < MIN_ENVELOPE:
+            return 0
+        if self.last_beat >= 0 and n - self.last_beat < self.refractory:
+            return 0
+
+        self.above = True
+        last = self.last_beat
+        self.last_beat = n
+        if last < 0:
+            return 0
+        ibi = (n - last) * 1000 // self.rate_hz
+        if ibi < IBI_MIN_MS or ibi > IBI_MAX_MS:
+            return 0
+        self.ibis[self.beats % self.capacity] = ibi
+        self.beats += 1
+        return ibi
+
+    def heart_rate(self):
+        # bpm from the latest IBI, 0 before the second beat
+        if not self.beats:
+            return 0
+        return 60000 // self.ibis[(self.beats - 1) % self.capacity]
+
+    def rmssd(self):
+        # short term HRV over the stored IBIs [ms]
+        count = min(self.beats, self.capacity)
+        if count < 2:
+            return 0
+        start = self.beats - count
+        total = 0
+        previous = self.ibis[start % self.capacity]
+        for i in range(start + 1, self.beats):
+            ibi = self.ibis[i % self.capacity]
+            total += (ibi - previous) * (ibi - previous)
+            previous = ibi
+        return isqrt(total // (count - 1))
+
+
+def isqrt(n):
+    x = n
+    y = (x + 1) // 2
+    while y < x:
+        x = y
+        y = (x + n // x) // 2
+    return x
+
+
+class ResonancePacer:
+
+    MIN_CYCLE_HS = 17       # half seconds, 7 breaths per minute
+    MAX_CYCLE_HS = 27       # 4.5 breaths per minute
+    CYCLES_PER_STEP = 2     # cycles averaged before the period moves
+
+    def __init__(self):
+        # IN share of the IN+OUT time, kept from the user's settings so that
+        # rounding to half seconds does not drift it over many steps
+        self.ratio = None
+        # paced durations of the running session in lib.MODES order, the
+        # settings keep the user's preset
+        self.half_seconds = [0, 0, 0, 0]
+        self.reset()
+
+    def reset(self):
+        self.cycle_min = 0
+        self.cycle_max = 0
+        self.swing_sum = 0
+        self.swing_cycles = 0
+        self.last_swing = -1
+        self.direction = 1
+        self.step = 2
+
+    def start(self, settings):
+        # every session starts from the user's durations
+        half_seconds = self.half_seconds
+        half_seconds[0] = settings.half_seconds_in
+        half_seconds[1] = settings.half_seconds_hold
+        half_seconds[2] = settings.half_seconds_out
+        half_seconds[3] = settings.half_seconds_stay
+        self.ratio = (half_seconds[0], half_seconds[0] + half_seconds[2])
+        self.reset()
+
+    def beat(self, ibi):
+        if not self.cycle_min or ibi < self.cycle_min:
+            self.cycle_min = ibi
+        if ibi > self.cycle_max:
+            self.cycle_max = ibi
+
+    def cycle_done(self):
+        # called once per breathing cycle, True if the pace was changed
+        swing = self.cycle_max - self.cycle_min if self.cycle_min else -1
+        self.cycle_min = self.cycle_max = 0
+        if swing < 0:
+            return False
+        self.swing_sum += swing
+        self.swing_cycles += 1
+        if self.swing_cycles < self.CYCLES_PER_STEP:
+            return False
+        swing = self.swing_sum // self.swing_cycles
+        self.swing_sum = self.swing_cycles = 0
+
+        if self.last_swing >= 0 and swing < self.last_swing:
+            # got worse, turn around with a finer step
+            self.direction = -self.direction
+            self.step = 1
+        self.last_swing = swing
+        current = self.cycle_half_seconds()
+        target = current + self.direction * self.step
+        if target < self.MIN_CYCLE_HS or target > self.MAX_CYCLE_HS:
+            # at the edge of the search range, search the other way
+            self.direction = -self.direction
+            target = current + self.direction * self.step
+        return self.apply(target)
+
+    def apply(self, cycle_hs):
+        half_seconds = self.half_seconds
+        cycle_hs = max(self.MIN_CYCLE_HS, min(self.MAX_CYCLE_HS, cycle_hs))
+        fixed = half_seconds[1] + half_seconds[3]
+        breathing = max(2, cycle_hs - fixed)
+        share, total = self.ratio
+        new_in = max(1, int((breathing * share + total // 2) // total))
+        new_out = max(1, breathing - new_in)
+        if new_in == half_seconds[0] and new_out == half_seconds[2]:
+            return False
+        half_seconds[0] = new_in
+        half_seconds[2] = new_out
+        return True
+
+    def cycle_half_seconds(self):
+        return sum(self.half_seconds)
+
+
+class PulseMonitor:
+    # glue for the session loop: poll() once per frame, cycle_done() once
+    # per breathing cycle
+
+    def __init__(self, source, rate_hz=RATE_HZ, adaptive=False, max_samples=16):
+        self.source = source
+        self.detector = BeatDetector(rate_hz)
+        self.pacer = ResonancePacer()
+        self.adaptive = adaptive
+        self.max_samples = max_samples
+
+    def start(self, settings):
+        self.detector.reset()
+        self.pacer.start(settings)
+        self.source.start()
+
+    def stop(self):
+        self.source.stop()
+
+    def poll(self):
+        # bounded work per call, the rest stays in the ring for next frame
+        source = self.source
+        detector = self.detector
+        pacer = self.pacer
+        for _ in range(self.max_samples):
+            sample = source.pop()
+            if sample < 0:
+                break
+            ibi = detector.feed(sample)
+            if ibi:
+                pacer.beat(ibi)
+
+    def cycle_done(self):
+        telemetry.emit(telemetry.EV_HEART_RATE, self.detector.heart_rate())
+        if not self.adaptive:
+            self.pacer.cycle_min = self.pacer.cycle_max = 0
+            return False
+        changed = self.pacer.cycle_done()
+        if changed:
+            telemetry.emit(telemetry.EV_PACING, self.pacer.cycle_half_seconds())
+        return changed
+
+    def pace(self, phase_ms):
+        # the session's phase durations, paced while adaptive
+        if self.adaptive:
+            half_seconds = self.pacer.half_seconds
+            for i in range(len(half_seconds)):
+                phase_ms[i] = half_seconds[i] * 500
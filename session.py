@@ -0,0 +1,261 @@
+import gc
+
+from lib import BreathingSettings, Mode, MODES, PROGRESS_MAX, get_signal_tone
+from profiler import STAGE_INPUT, STAGE_PROGRESS, STAGE_RENDER, STAGE_FLUSH
+from clock import CLOCK
+from power import DutyMeter
+from timing import PhaseTiming
+import power
+import sessionlog
+import telemetry
+
+# The breathing session engine.
+# Runs the IN/HOLD/OUT/STAY phases against a backend (lcd, pico_explorer or
+# anything with the same surface: render, flush, playtone, bequiet,
+# button_*, STATIC_MODES, BUTTON_PINS) and a clock from clock.py. With a
+# SimClock the whole session runs as fast as the host can render frames,
+# see host/simulate.py. With a sessionlog.SessionLog every finished session
+# is appended to the log in flash.
+
+SOUND_DURATION_MS = 10
+FINAL_TONE_MS = 500
+
+
+class Session:
+
+    def __init__(self, backend, clock=CLOCK, profiler=None, gc_monitor=None,
+                 idle_static=True, collect=gc.collect, pulse=None, breath=None, log=None):
+        self.backend = backend
+        self.clock = clock
+        self.profiler = profiler
+        self.gc_monitor = gc_monitor
+        self.idle_static = idle_static
+        self.collect = gc_monitor.collect if gc_monitor else collect
+        self.duty = DutyMeter(MODES)
+        self.timing = PhaseTiming()
+        self.pulse = pulse
+        self.breath = breath
+        self.log = log
+        self.playing = False
+
+        up = backend.button_up
+        down = backend.button_down
+        left = backend.button_left
+        right = backend.button_right
+
+        def any_button_pressed():
+            return up() or down() or left() or right()
+
+        self.any_button_pressed = any_button_pressed
+
+        if pulse is not None or breath is not None:
+            # keep the sensor pipelines fed while idling in static phases
+            def idle_wake():
+                if pulse:
+                    pulse.poll()
+                if breath:
+                    breath.poll()
+                return any_button_pressed()
+        else:
+            idle_wake = any_button_pressed
+        self.idle_wake = idle_wake
+
+    def stop(self):
+        self.playing = False
+
+    def run(self, settings: BreathingSettings):
+        backend = self.backend
+        clock = self.clock
+        render = backend.render
+        flush = backend.flush
+        playtone = backend.playtone
+        bequiet = backend.bequiet
+        any_button_pressed = self.any_button_pressed
+        ticks_ms = clock.ticks_ms
+        ticks_us = clock.ticks_us
+        ticks_diff = clock.ticks_diff
+        ticks_add = clock.ticks_add
+
+        bequiet()
+
+        # everything the frame loop needs is computed up front, the loop itself
+        # only works with small ints and must not allocate
+        phase_ms = [settings.get_ms(mode) for mode in MODES]
+        phase_tones = [get_signal_tone(mode) for mode in MODES]
+        phase_static = [self.idle_static and mode in backend.STATIC_MODES for mode in MODES]
+        total_duration_ms = int(settings.total_duration * 60 * 1000)
+        sound_duration_ms = SOUND_DURATION_MS
+        monitor = self.gc_monitor
+        collect = self.collect
+        prof = self.profiler
+        duty = self.duty
+        timing = self.timing
+        pulse = self.pulse
+        breath = self.breath
+        idle_wake = self.idle_wake
+
+        collect()
+        if monitor:
+            monitor.reset()
+        if prof:
+            prof.reset()
+        duty.reset()
+        timing.reset()
+        if self.idle_static:
+            power.arm_wake(backend.BUTTON_PINS)
+        if pulse:
+            pulse.start(settings)
+        if breath:
+            breath.start()
+
+        telemetry.emit(telemetry.EV_SESSION_START, settings.total_duration)
+        cycles = 0
+        self.playing = True
+
+        start_time = ticks_ms()
+
+        while True:
+
+            # make interruptable
+            if any_button_pressed():
+                self.playing = False
+            if not self.playing:
+                break
+
+            for i in range(len(MODES)):
+
+                mode = MODES[i]
+                current_cycle_length_ms = phase_ms[i]
+                static = phase_static[i]
+
+                if current_cycle_length_ms == 0:
+                    continue
+
+                if not self.playing:
+                    break
+
+                tone_start = ticks_us()
+                mode_start_time = ticks_ms()
+                playtone(phase_tones[i])
+                tone_on = True
+                timing.phase_started(ticks_diff(mode_start_time, start_time),
+                                     current_cycle_length_ms,
+                                     ticks_diff(ticks_us(), tone_start))
+                telemetry.emit(telemetry.EV_PHASE, i)
+                if breath:
+                    breath.phase_started(i)
+
+                # phase boundary: clean up and talk to the host now instead of
+                # mid animation
+                collect()
+                telemetry.drain()
+                frames = 0
+                frame_max_us = 0
+
+                while True:
+
+                    frame_start = ticks_us()
+                    frame_begin = frame_start
+
+                    # make interruptable
+                    if any_button_pressed():
+                        self.playing = False
+                    if prof:
+                        frame_start = prof.mark(STAGE_INPUT, frame_start)
+                    if not self.playing:
+                        break
+
+                    elapsed = ticks_diff(ticks_ms(), mode_start_time)
+
+                    if tone_on and elapsed > sound_duration_ms:
+                        bequiet()
+                        tone_on = False
+
+                    if elapsed >= current_cycle_length_ms:
+                        progress = PROGRESS_MAX
+                    else:
+                        progress = elapsed * PROGRESS_MAX // current_cycle_length_ms
+                    if prof:
+                        frame_start = prof.mark(STAGE_PROGRESS, frame_start)
+
+                    render(progress, mode)
+                    if prof:
+                        frame_start = prof.mark(STAGE_RENDER, frame_start)
+                    flush()
+                    if prof:
+                        prof.mark(STAGE_FLUSH, frame_start)
+
+                    if monitor:
+                        monitor.frame()
+
+                    if pulse:
+                        pulse.poll()
+                    if breath:
+                        breath.poll()
+
+                    frames += 1
+                    frame_us = ticks_diff(ticks_us(), frame_begin)
+                    if frame_us > frame_max_us:
+                        frame_max_us = frame_us
+
+                    if progress >= PROGRESS_MAX:
+                        break
+
+                    if static:
+                        # nothing changes on screen until the tone has to stop or
+                        # the phase ends, sleep until then
+                        if tone_on:
+                            wake_at = ticks_add(mode_start_time, sound_duration_ms + 1)
+                        else:
+                            wake_at = ticks_add(mode_start_time, current_cycle_length_ms)
+                        duty.idle(i, power.idle_until(wake_at, idle_wake, clock))
+                bequiet()
+                duty.phase_done(i, ticks_diff(ticks_ms(), mode_start_time))
+                telemetry.emit(telemetry.EV_FRAMES, frames)
+                telemetry.emit(telemetry.EV_FRAME_MAX, frame_max_us // 1000)
+                telemetry.emit(telemetry.EV_DUTY, duty.last_duty)
+
+            cycles += 1
+            if pulse and pulse.cycle_done():
+                # HRV pacing moved the IN/OUT durations of this session
+                pulse.pace(phase_ms)
+            elapsed_total = ticks_diff(ticks_ms(), start_time)
+            if elapsed_total > total_duration_ms:
+                break
+        bequiet()
+        self.playing = False
+        timing.session_done(ticks_diff(ticks_ms(), start_time))
+
+        if self.idle_static:
+            power.disarm_wake(backend.BUTTON_PINS)
+        if pulse:
+            pulse.stop()
+        if breath:
+            breath.stop()
+
+        telemetry.emit(telemetry.EV_SESSION_END, cycles)
+        telemetry.emit(telemetry.EV_DRIFT, timing.max_drift_ms)
+        telemetry.emit(telemetry.EV_OVERRUN, timing.overrun_ms)
+        telemetry.drain()
+
+        # final tone at end
+        playtone(get_signal_tone(Mode.STAY))
+        clock.sleep_ms(FINAL_TONE_MS)
+        bequiet()
+
+        if self.log:
+            self.log.append(settings, timing, cycles,
+                            breath.mean_score() if breath else sessionlog.NO_ADHERENCE,
+                            pulse.detector.heart_rate() if pulse else 0)
+
+        return cycles
+
+    def report(self):
+        if self.gc_monitor:
+            self.gc_monitor.report()
+        if self.profiler:
+            self.profiler.report()
+        if self.breath:
+            self.breath.report()
+        self.duty.report()
+        self.timing.report()
@@ -0,0 +1,111 @@
+import struct
+import time
+
+try:
+    from machine import unique_id
+except ImportError:
+    unique_id = None
+
+from lib import MODES
+
+# Per session records in flash, for export and analysis on the host
+# (host/analyze_sessions.py). Records have a fixed size and live in a ring
+# of CAPACITY slots after a small header, so appending is one seek and one
+# write and the file never grows past HEADER_SIZE + CAPACITY * RECORD_SIZE.
+# Copy the file off the device with "mpremote cp :sessions.bin .".
+# The RTC is not battery backed: after a power cycle it starts again at
+# 2021-01-01 unless a host (Thonny, mpremote rtc --set) sets it. Records
+# say whether the clock was set; without it the timestamp only orders
+# sessions within one boot and the sequence number is what counts.
+#
+# header (little endian, 16 bytes):
+#   MAGIC | record size u16 | capacity u16 | next sequence u32 | 4 pad
+# record (little endian, 64 bytes):
+#   sequence u32 (0 = empty slot) | timestamp u32 [s, device clock]
+#   version u8 | board u8 (index into boards.BOARDS) | device id 8 bytes
+#   half seconds in, hold, out, stay u8 x4 | total duration u8 [min]
+#   cycles u16 | session length u32 [ms] | phases u16
+#   max drift i32 [ms] | mean boundary error i32 [us] | max boundary error i32 [ms]
+#   mean tone latency i32 [us] | max tone latency i32 [us] | overrun i32 [ms]
+#   adherence u8 [%, 255 = no breath tracking] | heart rate u8 [bpm, 0 = none]
+#   completed u8 | clock set u8 (timestamp is wall time) | 5 pad
+
+FILE = "sessions.bin"
+MAGIC = b"SLG1"
+VERSION = 2
+HEADER = "<4sHHI4x"
+HEADER_SIZE = 16
+RECORD = "<IIBB8sBBBBBHIHiiiiiiBBBB5x"
+RECORD_SIZE = 64
+CAPACITY = 512
+
+NO_BOARD = 255
+NO_ADHERENCE = 255
+
+# an RTC that was never set reads 2021
+VALID_YEAR = 2024
+
+
+def _u8(value):
+    return max(0, min(255, int(value)))
+
+
+def clock_set(timestamp):
+    return time.gmtime(int(timestamp))[0] >= VALID_YEAR
+
+
+class SessionLog:
+
+    def __init__(self, path=FILE, board=NO_BOARD, capacity=CAPACITY, device=None, time_s=None):
+        self.path = path
+        self.time_s = time_s or time.time
+        self.board = board
+        self.capacity = capacity
+        if device is None:
+            device = unique_id() if unique_id else b""
+        self.device = device
+        self.record = bytearray(RECORD_SIZE)
+        self.header = bytearray(HEADER_SIZE)
+
+    def _open(self):
+        # the log file positioned anywhere, created if missing or foreign
+        try:
+            f = open(self.path, "r+b")
+            if f.readinto(self.header) == HEADER_SIZE:
+                magic, size, capacity, sequence = struct.unpack(HEADER, self.header)
+                if magic == MAGIC and size == RECORD_SIZE:
+                    return f, capacity, sequence
+            f.close()
+        except OSError:
+            pass
+        f = open(self.path, "w+b")
+        f.write(struct.pack(HEADER, MAGIC, RECORD_SIZE, self.capacity, 1))
+        return f, self.capacity, 1
+
+    def append(self, settings, timing, cycles, adherence=NO_ADHERENCE, heart_rate=0,
+               timestamp=None):
+        if timestamp is None:
+            timestamp = self.time_s()
+        half_seconds = [_u8(settings.get_ms(mode) // 500) for mode in MODES]
+        completed = timing.end_ms > settings.total_duration * 60 * 1000
+        phases, drift, error, max_error, tone, max_tone, overrun = timing.summary()
+        struct.pack_into(RECORD, self.record, 0, 0, int(timestamp), VERSION, self.board,
+                         self.device, half_seconds[0], half_seconds[1], half_seconds[2],
+                         half_seconds[3], _u8(settings.total_duration), min(cycles, 0xFFFF),
+                         max(0, timing.end_ms), min(phases, 0xFFFF), drift, error, max_error,
+                         tone, max_tone, overrun, _u8(adherence), _u8(heart_rate),
+                         1 if completed else 0, 1 if clock_set(timestamp) else 0)
+        try:
+            f, capacity, sequence = self._open()
+            try:
+                struct.pack_into("<I", self.record, 0, sequence)
+                f.seek(HEADER_SIZE + (sequence - 1) % capacity * RECORD_SIZE)
+                f.write(self.record)
+                f.seek(8)
+                f.write(struct.pack("<I", sequence + 1))
+            finally:
+                f.close()
+            return sequence
+        except OSError as e:
+            print("Could not log session", e)
+            return 0
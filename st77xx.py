@@ -0,0 +1,150 @@
+from machine import Pin,SPI,PWM
+import framebuf
+import time
+
+from fastpath import upscale_row
+
+# Shared core for the Waveshare ST7735S / ST7789 panels.
+# Subclasses only describe the geometry and the init table, everything that
+# touches the SPI bus lives here. Register writes go through preallocated
+# buffers so that flushing a frame does not allocate.
+#
+# Coarse pictures can be drawn at a fraction of the panel resolution into
+# scaled_canvas() and sent with show_scaled(), which repeats every pixel
+# scale x scale times while streaming the rows to the panel. The canvas
+# lives at the start of the panel buffer, so it needs no extra RAM and
+# leaves the full resolution buffer for the menu.
+#
+# With a mirror.Mirror assigned to .mirror every flushed frame is also sent
+# to the host, see host/mirror_viewer.py.
+
+BL = 13
+DC = 8
+RST = 12
+MOSI = 11
+SCK = 10
+CS = 9
+
+
+class ST77xx(framebuf.FrameBuffer):
+
+    # geometry: visible size and offset of the visible area in panel RAM
+    WIDTH = 0
+    HEIGHT = 0
+    X_OFFSET = 0
+    Y_OFFSET = 0
+
+    # init table: (command, argument bytes, delay in ms after the command)
+    INIT = ()
+    RESET_DELAY_MS = 0
+    BACKLIGHT = None  # None keeps the backlight pin untouched, else 0..1000
+
+    def __init__(self, buffer=None):
+        self.width = self.WIDTH
+        self.height = self.HEIGHT
+
+        self.cs = Pin(CS,Pin.OUT)
+        self.rst = Pin(RST,Pin.OUT)
+        self.cs(1)
+        self.spi = SPI(1,10000_000,polarity=0, phase=0,sck=Pin(SCK),mosi=Pin(MOSI),miso=None)
+        self.dc = Pin(DC,Pin.OUT)
+        self.dc(1)
+
+        # command byte scratch, reused for every register write
+        self._cmd = bytearray(1)
+        # window commands for the full screen, built once
+        self._window = (
+            self._window_args(self.X_OFFSET, self.X_OFFSET + self.width - 1),
+            self._window_args(self.Y_OFFSET, self.Y_OFFSET + self.height - 1),
+        )
+
+        if buffer is None:
+            buffer = bytearray(self.height * self.width * 2)
+        self.buffer = buffer
+        self._line = None
+        self.mirror = None
+        super().__init__(self.buffer, self.width, self.height, framebuf.RGB565)
+        self.init_display()
+
+    @staticmethod
+    def _window_args(start, end):
+        return bytes((start >> 8, start & 0xFF, end >> 8, end & 0xFF))
+
+    def reset(self):
+        delay = self.RESET_DELAY_MS
+        self.rst(1)
+        time.sleep_ms(delay)
+        self.rst(0)
+        time.sleep_ms(delay)
+        self.rst(1)
+        time.sleep_ms(delay)
+
+    def write_cmd(self, cmd, data=None):
+        self._cmd[0] = cmd
+        self.dc(0)
+        self.cs(0)
+        self.spi.write(self._cmd)
+        if data is not None:
+            self.dc(1)
+            self.spi.write(data)
+        self.cs(1)
+
+    def backlight(self,value):#value:  min:0  max:1000
+        pwm = PWM(Pin(BL))
+        pwm.freq(1000)
+        if value>=1000:
+            value=1000
+        data=int (value*65536/1000)
+        pwm.duty_u16(min(data, 65535))
+
+    def init_display(self):
+        """Initialize display"""
+        self.reset()
+        if self.BACKLIGHT is not None:
+            self.backlight(self.BACKLIGHT)
+        for cmd, data, delay in self.INIT:
+            self.write_cmd(cmd, data or None)
+            if delay:
+                time.sleep_ms(delay)
+
+    def _full_window(self):
+        # address the whole visible area for the next RAM write
+        self.write_cmd(0x2A, self._window[0])
+        self.write_cmd(0x2B, self._window[1])
+
+    def show(self):
+        self._full_window()
+        self.write_cmd(0x2C, self.buffer)
+        if self.mirror is not None:
+            self.mirror.frame(self.buffer, self.width, self.height)
+
+    def scaled_canvas(self, scale):
+        # (framebuffer, width, height) at 1/scale of the panel resolution
+        if scale == 1:
+            return self, self.width, self.height
+        width = self.width // scale
+        height = self.height // scale
+        if width * scale != self.width:
+            raise ValueError("panel width %d is not a multiple of %d" % (self.width, scale))
+        self._line = bytearray(self.width * 2)
+        return framebuf.FrameBuffer(self.buffer, width, height, framebuf.RGB565), width, height
+
+    def show_scaled(self, buffer, width, height, scale):
+        # send a width x height RGB565 image scaled up by scale; panel rows
+        # left over by the rounding repeat the last image row
+        line = self._line
+        spi = self.spi
+        self._full_window()
+        self.write_cmd(0x2C)
+        self.dc(1)
+        self.cs(0)
+        row_bytes = width * 2
+        for y in range(height):
+            upscale_row(buffer, y * row_bytes, line, scale)
+            for _ in range(scale):
+                spi.write(line)
+        for _ in range(self.height - height * scale):
+            spi.write(line)
+        self.cs(1)
+        if self.mirror is not None:
+            self.mirror.frame(buffer, width, height, scale)
@@ -0,0 +1,152 @@
+import sys
+import struct
+
+try:
+    import select
+except ImportError:
+    select = None
+
+from clock import CLOCK
+from fastpath import checksum
+
+# Buffered, non-blocking event channel over the USB serial console.
+# Events are packed into fixed size binary records in a ring buffer and only
+# written out when the host is actually reading. A full ring drops the new
+# event and counts it instead of stalling the caller, the number of dropped
+# events is reported with the next event that fits.
+# The stream is the REPL console, so it is off until main.py turns it on
+# (SERIAL_TELEMETRY). POLLOUT only promises some free space in the USB
+# FIFO, so drain() writes one record per check; a record the FIFO took only
+# part of is dropped, not sent again, and the reader resyncs on the next.
+# host/telemetry_reader.py decodes the stream.
+#
+# record layout (little endian, 9 bytes):
+#   sync 0xA5 | kind u8 | value i16 | ticks_ms u32 | checksum u8
+# checksum is the low byte of the sum of the first 8 bytes
+
+SYNC = 0xA5
+RECORD = "<BBhI"
+RECORD_SIZE = 9
+
+EV_SESSION_START = 1    # value: total duration [min]
+EV_SESSION_END = 2      # value: completed cycles
+EV_PHASE = 3            # value: index into lib.MODES
+EV_FRAMES = 4           # value: frames rendered in the last phase
+EV_FRAME_MAX = 5        # value: slowest frame of the last phase [ms]
+EV_BUTTON = 6           # value: BUTTON_* below
+EV_SAVED = 7            # settings written to flash
+EV_DROPPED = 8          # value: events dropped since the last report
+EV_DUTY = 9             # value: CPU busy share of the last phase [permille]
+EV_HEART_RATE = 10      # value: heart rate at the end of a cycle [bpm]
+EV_PACING = 11          # value: new breathing cycle length [half seconds]
+EV_ADHERENCE = 12       # value: share of the last cycle that matched the cues [%]
+EV_DRIFT = 13           # value: max phase start drift of the session [ms]
+EV_OVERRUN = 14         # value: session end behind the phase schedule [ms]
+EV_SAMPLES_LOST = 15    # value: breath sound samples the full ring dropped in the session
+
+BUTTON_UP = 0
+BUTTON_DOWN = 1
+BUTTON_LEFT = 2
+BUTTON_RIGHT = 3
+
+
+class Telemetry:
+
+    def __init__(self, capacity=64, stream=None, clock=None):
+        self.capacity = capacity
+        self.clock = clock or CLOCK
+        self.ring = bytearray(capacity * RECORD_SIZE)
+        self.ring_mv = memoryview(self.ring)
+        self.head = 0   # next record to write
+        self.tail = 0   # next record to send
+        self.pending = 0
+        self.dropped = 0
+        self.enabled = False
+        if stream is None:
+            stream = getattr(sys.stdout, "buffer", sys.stdout)
+        self.stream = stream
+        try:
+            # MicroPython streams take an offset and length, no slice needed
+            stream.write(self.ring, 0, 0)
+            self.sized_write = True
+        except TypeError:
+            self.sized_write = False
+        self.poller = None
+        if select is not None:
+            try:
+                self.poller = select.poll()
+                self.poller.register(sys.stdout, select.POLLOUT)
+            except (AttributeError, OSError, ValueError):
+                self.poller = None
+
+    def _put(self, kind, value):
+        if value > 32767:
+            value = 32767
+        elif value < -32768:
+            value = -32768
+        offset = self.head * RECORD_SIZE
+        ring = self.ring
+        struct.pack_into(RECORD, ring, offset, SYNC, kind, value, self.clock.ticks_ms())
+        ring[offset + RECORD_SIZE - 1] = checksum(ring, offset, offset + RECORD_SIZE - 1)
+        self.head = (self.head + 1) % self.capacity
+        self.pending += 1
+
+    def emit(self, kind, value=0):
+        if not self.enabled:
+            return False
+        free = self.capacity - self.pending
+        if self.dropped:
+            # one slot is needed for the drop report in front of the event
+            if free < 2:
+                self.dropped += 1
+                return False
+            self._put(EV_DROPPED, self.dropped)
+            self.dropped = 0
+        elif free < 1:
+            self.dropped += 1
+            return False
+        self._put(kind, value)
+        return True
+
+    def writable(self):
+        if self.poller is None:
+            return True
+        if hasattr(self.poller, "ipoll"):
+            # ipoll() reuses its result, poll() builds a list
+            for _ in self.poller.ipoll(0):
+                return True
+            return False
+        return bool(self.poller.poll(0))
+
+    def drain(self, max_records=16):
+        # send what the host can take right now, never wait for it
+        sent = 0
+        while self.pending and sent < max_records:
+            if not self.writable():
+                break
+            start = self.tail * RECORD_SIZE
+            if self.sized_write:
+                written = self.stream.write(self.ring, start, RECORD_SIZE)
+            else:
+                written = self.stream.write(self.ring_mv[start:start + RECORD_SIZE])
+            if not written:
+                break
+            self.tail = (self.tail + 1) % self.capacity
+            self.pending -= 1
+            if written < RECORD_SIZE:
+                # the rest would not frame as a record any more
+                self.dropped += 1
+                break
+            sent += 1
+        return sent
+
+
+TELEMETRY = Telemetry()
+
+
+def emit(kind, value=0):
+    return TELEMETRY.emit(kind, value)
+
+
+def drain(max_records=16):
+    return TELEMETRY.drain(max_records)
@@ -0,0 +1,80 @@
+# Phase timing accuracy of a breathing session.
+# Every phase times itself from its own start, so each boundary lands a
+# little late (up to a frame, plus the tone and bookkeeping at the switch)
+# and the lateness adds up over the session. PhaseTiming keeps the ideal
+# schedule (session start + requested phase lengths) next to the actual
+# phase starts and updates its statistics per boundary with a few integer
+# operations, no per cycle lists. All times are ms since the session start,
+# tone onset latency is in us.
+#
+#   drift           actual - scheduled start of a phase, grows over time
+#   boundary error  lateness added by one boundary (drift step)
+#   tone latency    actual phase start until playtone() returned
+#   overrun         actual - scheduled end of the last phase
+
+
+class PhaseTiming:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.scheduled_ms = 0
+        self.boundaries = 0
+        self.drift_ms = 0
+        self.max_drift_ms = 0
+        self.error_sum_ms = 0
+        self.max_error_ms = 0
+        self.tone_sum_us = 0
+        self.max_tone_us = 0
+        self.overrun_ms = 0
+        self.end_ms = 0
+
+    def phase_started(self, actual_ms, length_ms, tone_us):
+        # actual_ms: phase start since session start, length_ms: requested
+        # length, tone_us: time spent starting the tone, counted from the
+        # actual start so it does not repeat the drift
+        drift = actual_ms - self.scheduled_ms
+        error = drift - self.drift_ms
+        self.drift_ms = drift
+        if abs(drift) > self.max_drift_ms:
+            self.max_drift_ms = abs(drift)
+        if self.boundaries:
+            # the first phase starts the schedule, it has no boundary before it
+            self.error_sum_ms += error
+            if abs(error) > self.max_error_ms:
+                self.max_error_ms = abs(error)
+        self.boundaries += 1
+
+        self.tone_sum_us += tone_us
+        if tone_us > self.max_tone_us:
+            self.max_tone_us = tone_us
+
+        self.scheduled_ms += length_ms
+
+    def session_done(self, actual_ms):
+        self.end_ms = actual_ms
+        self.overrun_ms = actual_ms - self.scheduled_ms
+
+    def mean_error_us(self):
+        if self.boundaries < 2:
+            return 0
+        return self.error_sum_ms * 1000 // (self.boundaries - 1)
+
+    def mean_tone_us(self):
+        if not self.boundaries:
+            return 0
+        return self.tone_sum_us // self.boundaries
+
+    def summary(self):
+        # (phases, max drift ms, mean boundary error us, max boundary error ms,
+        #  mean tone latency us, max tone latency us, overrun at end ms)
+        return (self.boundaries, self.max_drift_ms, self.mean_error_us(), self.max_error_ms,
+                self.mean_tone_us(), self.max_tone_us, self.overrun_ms)
+
+    def report(self):
+        phases, drift, error, max_error, tone, max_tone, overrun = self.summary()
+        print("timing: %d phases, max drift %d ms, boundary error mean %d us max %d ms"
+              % (phases, drift, error, max_error))
+        print("timing: tone latency mean %d max %d us, overrun at end %d ms"
+              % (tone, max_tone, overrun))